@@ -1,74 +1,150 @@
 import ex3 as ex3
+import multiprocessing
+import signal
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from inputs import non_comp_problems
 
 TIMEOUT_DURATION = 60
 
-def timeout_exec(func, args=(), kwargs={}, timeout_duration=10, default=None):
-    """This function will spawn a thread and run the given function
-    using the args, kwargs and return the given default value if the
-    timeout_duration is exceeded.
-    """
-    import threading
+def run_in_child(conn, func, args, kwargs):
+    """Process body of timeout_exec: sends back (True, result) or (False, exception)."""
+    # terminate() raises SystemExit here, so finally blocks (e.g. killing a solver's own workers) still run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    try:
+        outcome = True, func(*args, **kwargs)
+    except Exception as error:
+        outcome = False, error
+    try:
+        conn.send(outcome)
+    except Exception as error:
+        # unpicklable result or exception
+        conn.send((False, RuntimeError(repr(error))))
+    conn.close()
 
-    class InterruptableThread(threading.Thread):
-        def __init__(self):
-            threading.Thread.__init__(self)
-            self.result = default
 
-        def run(self):
-            self.result = func(*args, **kwargs)
+# how long timeout_exec lets a terminated child exit before killing it
+TERMINATE_GRACE = 0.5
 
-    it = InterruptableThread()
-    it.start()
-    it.join(timeout_duration)
-    if it.is_alive():
-        return default
-    else:
-        return it.result
 
+def timeout_exec(func, args=(), kwargs={}, timeout_duration=10, default=None):
+    """This function will spawn a process and run the given function
+    using the args, kwargs and return the given default value if the
+    timeout_duration is exceeded. The process is killed at the deadline, so
+    a timed-out call stops using CPU and memory. Exceptions are re-raised here.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_in_child, args=(sender, func, args, kwargs))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(max(timeout_duration, 0)):
+            return default
+        ok, result = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f'{getattr(func, "__name__", func)} exited without a result')
+    finally:
+        if process.is_alive():
+            process.terminate()
+            # the SIGTERM handler only runs between bytecodes - a child inside a long C call needs SIGKILL
+            process.join(TERMINATE_GRACE)
+            if process.is_alive():
+                process.kill()
+        process.join()
+        receiver.close()
+    if not ok:
+        raise result
+    return result
+
+
+# what the solver's own deadline leaves timeout_exec for sending the answer back
+SOLVER_TIMEOUT_MARGIN = 0.5
+
+
+def run_pipeline(p, translator_to_CNF, SAT_solver, translator_from_assignment, deadline=None):
+    """With a deadline (a time.time() value) the solver gets max_seconds for what encoding left of it."""
+    variables, CNF_formula = translator_to_CNF(p)
+    if deadline is not None:
+        max_seconds = max(deadline - time.time() - SOLVER_TIMEOUT_MARGIN, 0)
+        is_satisfiable, assignment = SAT_solver(variables, CNF_formula, {}, max_seconds=max_seconds)
+    else:
+        is_satisfiable, assignment = SAT_solver(variables, CNF_formula, {})
+    if is_satisfiable is ex3.UNKNOWN:
+        # the solver ran out of its own budget - same as a timeout
+        return None
+    board = translator_from_assignment(variables, assignment, p) if is_satisfiable else [[]]
+    return is_satisfiable, assignment, board
 
 
-def solve_problem(p, translator_to_CNF, SAT_solver, translator_from_assignment, timeout):
+def solve_problem(p, translator_to_CNF, SAT_solver, translator_from_assignment, timeout, budgeted=False):
+    """budgeted tells that SAT_solver takes max_seconds: it then stops itself shortly before the timeout."""
     t0 = time.time()
 
     try:
+        # the whole pipeline runs in one process, so the CNF never has to be copied between steps
         res = timeout_exec(
-            translator_to_CNF, [p], timeout_duration=timeout
+            run_pipeline,
+            [p, translator_to_CNF, SAT_solver, translator_from_assignment, t0 + timeout if budgeted else None],
+            timeout_duration=timeout
         )
         if res is None:
             return None, None, None, -2
-        variables, CNF_formula = res
+        is_satisfiable, assignment, board = res
+
+        return is_satisfiable, assignment, board, time.time() - t0
+
+    except Exception:
+        return None, None, None, -3
 
+
+def solve_one(p, timeout):
+    """Worker side of solve_many: solve_problem's result tuple plus per-stage timings.
+    Only the search stops itself at the deadline - encoding and decoding always run to the end.
+    They are kept short instead: the formula is an 'arena' one built on the worker's cached
+    template (the assignment comes back as an ex3.Assignment)."""
+    t0 = time.time()
+    timings = {}
+    try:
+        variables, CNF_formula = ex3.to_CNF(p, 'arena')
         t1 = time.time()
-        res = timeout_exec(
-            SAT_solver,
-            [variables, CNF_formula, {}],
-            timeout_duration=timeout - (t1 - t0)
-        )
-        if res is None:
-            return None, None, None, -2
-        is_satisfiable, assignment = res
+        timings['encode'] = t1 - t0
+        if t1 - t0 >= timeout:
+            return (None, None, None, -2), timings
 
+        is_satisfiable, assignment = ex3.solve_SAT(variables, CNF_formula, {}, max_seconds=timeout - (t1 - t0))
         t2 = time.time()
-        if is_satisfiable:
-            res = timeout_exec(
-                translator_from_assignment,
-                [variables, assignment, p],
-                timeout_duration=timeout - (t2 - t0)
-            )
-            if res is None:
-                return None, None, None, -2
-            board = res
-        else:
-            board = [[]]
+        timings['solve'] = t2 - t1
+        if is_satisfiable is ex3.UNKNOWN:
+            return (None, None, None, -2), timings
 
-        return is_satisfiable, assignment, board, time.time() - t0
+        board = ex3.numbers_assignment(variables, assignment, p) if is_satisfiable else [[]]
+        timings['decode'] = time.time() - t2
+        if time.time() - t0 >= timeout:
+            return (None, None, None, -2), timings
+        return (is_satisfiable, assignment, board, time.time() - t0), timings
 
     except Exception:
-        return None, None, None, -3
+        return (None, None, None, -3), timings
 
 
+def solve_many(problems, workers=None, timeout=TIMEOUT_DURATION):
+    """
+    Solves problems on a pool of worker processes (one per core by default) and yields
+    (index, result, timings) in the order they finish. result is solve_problem's tuple, so
+    timeouts and errors come back as -2 / -3. Workers stay up for the whole batch and keep
+    their encoding caches between puzzles.
+    """
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {executor.submit(solve_one, p, timeout): index for index, p in enumerate(problems)}
+        for future in as_completed(futures):
+            try:
+                result, timings = future.result()
+            except Exception:
+                # the worker itself died (e.g. out of memory)
+                result, timings = (None, None, None, -3), {}
+            yield futures[future], result, timings
+
 
 def solve_problems(problems):
     solved = 0
@@ -77,7 +153,9 @@ def solve_problems(problems):
         counter += 1
         print(f'---------------- PROBLEM NUMBER {counter} ----------------')
         timeout = TIMEOUT_DURATION
-        solvable, assignment, board, time = solve_problem(p, ex3.to_CNF, ex3.solve_SAT, ex3.numbers_assignment, timeout)
+        # the solver gives up on its own just before the timeout; killing the process is only the fallback
+        solvable, assignment, board, time = solve_problem(p, ex3.to_CNF, ex3.solve_SAT, ex3.numbers_assignment,
+                                                          timeout, budgeted=True)
         if solvable is None:
             print("The code didn't run correctly")
             continue
@@ -1,7 +1,24 @@
 from typing import Any, List, Optional, Tuple
-from itertools import product
-from collections import Counter, defaultdict
-from functools import lru_cache
+from array import array
+from itertools import chain, islice, product
+from math import ceil, sqrt
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache, partial
+
+from utils import IndexedMaxHeap
+
+try:
+    import numpy as np
+except ImportError:  # only vectorized_structure and propagate_batch need it
+    np = None
 
 ids = ["111111111, 222222222"]
 
@@ -15,84 +32,1017 @@ list[
 '''
 
 
-def to_CNF(input: list[tuple[int, int], tuple[int, int, int], tuple[int, int, int, int, int]]) -> tuple[
-    list, list[list[tuple[Any, bool]]]]:
-    # print(input)
+# --- Variable encoding ---
+# Variables come in two forms:
+#   'str': 'row,col,val' names, literals are (name, bool) tuples (the grading API form)
+#   'int': dense integers (row * N + col) * N + val, literals are signed ints
+#   'arena': the 'int' variables with all clauses packed in one ClauseArena
+ENCODINGS = ('str', 'int', 'arena')
+
+
+class BoardVariables(list):
+    """
+    List of variables that remembers the board size N it was encoded for, and the
+    cells decided before encoding ({(row, col): val}) whose variables were left out.
+    """
+
+    def __init__(self, iterable=(), N=0, decided=None):
+        super().__init__(iterable)
+        self.N = N
+        self.decided = decided if decided is not None else {}
+
+
+class ClauseArena:
+    """
+    Integer clauses in CSR layout: the literals of every clause back to back in one
+    array('i'), clause k being lits[offsets[k]:offsets[k + 1]] (offsets are int32 as well,
+    which holds formulas of up to 2**31 literals).
+    Costs 4 bytes per literal plus 4 per clause where a list of tuples costs ~100 per binary
+    clause, and gives the garbage collector nothing to track. Iterating yields array slices.
+    """
+    __slots__ = ('lits', 'offsets')
+
+    def __init__(self, clauses=()):
+        self.lits = array('i')
+        self.offsets = array('i', [0])
+        self.extend(clauses)
+
+    def append(self, clause) -> None:
+        self.lits.extend(clause)
+        self.offsets.append(len(self.lits))
+
+    def extend(self, clauses) -> None:
+        if isinstance(clauses, ClauseArena):
+            base = len(self.lits)
+            self.lits.extend(clauses.lits)
+            self.offsets.extend(offset + base for offset in islice(clauses.offsets, 1, None))
+            return
+        lits, offsets = self.lits, self.offsets
+        for clause in clauses:
+            lits.extend(clause)
+            offsets.append(len(lits))
+
+    @classmethod
+    def from_buffers(cls, lits, offsets) -> 'ClauseArena':
+        """Wraps contiguous int32 literal and offset buffers (e.g. NumPy arrays) in one copy."""
+        arena = cls()
+        arena.lits.frombytes(memoryview(lits).cast('B'))
+        arena.offsets = array('i')
+        arena.offsets.frombytes(memoryview(offsets).cast('B'))
+        return arena
+
+    def tolist(self) -> list[list[int]]:
+        """The clauses as lists of ints."""
+        lits, offsets = self.lits.tolist(), self.offsets.tolist()
+        return [lits[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k: int) -> array:
+        if k < 0:
+            k += len(self)
+        return self.lits[self.offsets[k]:self.offsets[k + 1]]
+
+    def __iter__(self):
+        lits, offsets = self.lits, self.offsets
+        for k in range(len(offsets) - 1):
+            yield lits[offsets[k]:offsets[k + 1]]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.lits) * self.lits.itemsize + len(self.offsets) * self.offsets.itemsize
+
+
+class Assignment(Mapping):
+    """
+    Model over integer variables 1..num_vars kept in an array: values[var] is 1 / 0, or -1
+    while var is unassigned. Reads like the {var: bool} dict solve_SAT returns otherwise.
+    """
+    __slots__ = ('values',)
+
+    def __init__(self, num_vars: int):
+        self.values = array('b', [-1]) * (num_vars + 1)
+
+    def __getitem__(self, var: int) -> bool:
+        if not 0 < var < len(self.values) or self.values[var] < 0:
+            raise KeyError(var)
+        return self.values[var] == 1
+
+    def __setitem__(self, var: int, val: bool) -> None:
+        self.values[var] = 1 if val else 0
+
+    def __iter__(self):
+        return (var for var, val in enumerate(self.values) if val >= 0 and var)
+
+    def __len__(self) -> int:
+        return len(self.values) - 1 - self.values.count(-1)
+
+
+def var_index(i: int, j: int, v: int, N: int) -> int:
+    """Returns the integer variable of 'value v is in cell (i, j)'."""
+    return (i * N + j) * N + v
+
+
+def var_coords(var: int, N: int) -> tuple[int, int, int]:
+    """Inverse of var_index: returns (row, col, val) of an integer variable."""
+    cell, val = divmod(var - 1, N)
+    i, j = divmod(cell, N)
+    return i, j, val + 1
+
+
+def var_name(var: int, N: int) -> str:
+    """Returns the 'row,col,val' string name of an integer variable ('aux<k>' for auxiliary ones)."""
+    if var > N * N * N:
+        return f'aux{var - N * N * N}'
+    i, j, v = var_coords(var, N)
+    return f'{i},{j},{v}'
+
+
+@lru_cache(maxsize=8)
+def literal_table(N: int, num_vars: int) -> tuple[list, list, list]:
+    """
+    Returns (names, positive, negative) lists indexed by integer variable 1..num_vars:
+    the string name and the shared (name, True) / (name, False) literal tuples.
+    """
+    names = [None] + [var_name(var, N) for var in range(1, num_vars + 1)]
+    positive = [None] + [(name, True) for name in names[1:]]
+    negative = [None] + [(name, False) for name in names[1:]]
+    return names, positive, negative
+
+
+def to_string_form(variables: list, clauses: list, N: int, num_vars: Optional[int] = None) -> tuple[list, list]:
+    """
+    Converts an integer-encoded (variables, clauses) pair to the string form.
+    num_vars is the largest variable used by the clauses (scanned when not given).
+    """
+    if num_vars is None:
+        num_vars = max((abs(lit) for clause in clauses for lit in clause), default=0)
+    num_vars = max(num_vars, max(variables, default=0))
+    names, positive, negative = literal_table(N, num_vars)
+    # Literal tuples are shared between clauses instead of rebuilt per occurrence
+    str_clauses = [[positive[lit] if lit > 0 else negative[-lit] for lit in clause] for clause in clauses]
+    return BoardVariables([names[var] for var in variables], N, getattr(variables, 'decided', None)), str_clauses
+
+
+def assignment_to_string_form(assignment: dict, N: int) -> dict:
+    """Converts an integer-keyed assignment to the 'row,col,val' keyed form."""
+    return {var_name(var, N): val for var, val in assignment.items()}
+
+
+def is_int_form(variables: list, CNF_formula: list) -> bool:
+    """True when the formula uses integer variables and signed int literals."""
+    if variables:
+        return isinstance(variables[0], int)
+    if isinstance(CNF_formula, ClauseArena):
+        return True
+    for clause in CNF_formula:
+        if clause:
+            return isinstance(clause[0], int)
+    return False
+
+
+# --- Domain reduction ---
+
+@lru_cache(maxsize=32)
+def cell_peers(L: int, K: int) -> tuple[frozenset, ...]:
+    """peers[i * N + j] = indices of the other cells sharing a row, column or LxK box with (i, j)."""
+    N = L * K
+    peers = []
+    for i, j in product(range(N), range(N)):
+        box_row, box_col = i // L * L, j // K * K
+        cells = {i * N + col for col in range(N)} | {row * N + j for row in range(N)}
+        cells |= {row * N + col for row in range(box_row, box_row + L) for col in range(box_col, box_col + K)}
+        cells.discard(i * N + j)
+        peers.append(frozenset(cells))
+    return tuple(peers)
+
+
+def reduce_domains(input: Any) -> list[set]:
+    """
+    Returns the candidate values of every cell (indexed i * N + j) left after
+    propagating the givens and the sum pairs to a fixpoint:
+    a decided cell removes its value from its peers, and a sum pair keeps only
+    values whose complement is still possible in the partner cell.
+    An empty set means the puzzle is contradictory.
+    """
     L, K = input[0]
-    known_locations = input[1]
-    sum_constraints = input[2]
+    N = L * K
+    peers = cell_peers(L, K)
+    domains = [set(range(1, N + 1)) for _ in range(N * N)]
+    for x, y, val in input[1]:
+        domains[x * N + y] &= {val}
+
+    partners = defaultdict(list)
+    for x1, y1, x2, y2, target_sum in input[2]:
+        partners[x1 * N + y1].append((x2 * N + y2, target_sum))
+        partners[x2 * N + y2].append((x1 * N + y1, target_sum))
+
+    pending = deque(range(N * N))
+    queued = [True] * (N * N)
+    while pending:
+        cell = pending.popleft()
+        queued[cell] = False
+        domain = domains[cell]
+        if not domain:
+            break
+        changed = []
+        if len(domain) == 1:
+            val = next(iter(domain))
+            for peer in peers[cell]:
+                if val in domains[peer]:
+                    domains[peer].discard(val)
+                    changed.append(peer)
+        for other, target_sum in partners[cell]:
+            allowed = {target_sum - val for val in domain}
+            # two peers can't hold the same value, so neither can be half the target
+            if other in peers[cell] and target_sum % 2 == 0:
+                allowed.discard(target_sum // 2)
+            if not domains[other] <= allowed:
+                domains[other] &= allowed
+                changed.append(other)
+        for other in changed:
+            if not queued[other]:
+                queued[other] = True
+                pending.append(other)
+    return domains
+
+
+@lru_cache(maxsize=32)
+def board_units(L: int, K: int) -> tuple[tuple[tuple[int, ...], ...], ...]:
+    """(rows, cols, boxes): the cell indices i * N + j of every row, column and LxK box, boxes row by row."""
+    N = L * K
+    rows = tuple(tuple(i * N + j for j in range(N)) for i in range(N))
+    cols = tuple(tuple(i * N + j for i in range(N)) for j in range(N))
+    boxes = tuple(tuple(row * N + col for row in range(top, top + L) for col in range(left, left + K))
+                  for top in range(0, N, L) for left in range(0, N, K))
+    return rows, cols, boxes
+
+
+PRESOLVE_RULES = ('naked_singles', 'hidden_singles', 'sums', 'naked_pairs', 'box_line')
 
+
+def propagate_candidates(input: Any, stats: Optional[dict] = None) -> Optional[list[int]]:
+    """
+    Sudoku logic on candidate bitmasks: masks[i * N + j] has bit v - 1 set while v is still
+    possible in (i, j). The rules run to a fixpoint, the pair rules only once the cheaper
+    ones are stuck:
+    naked singles - a decided cell's value leaves its peers,
+    hidden singles - a value with one place left in a unit goes there,
+    sums - a sum pair keeps complementary values only, never half the target in two peers,
+    naked pairs - two cells of a unit with the same two candidates take them from the rest,
+    box_line - a value confined to one line of a box leaves the rest of that line, and a
+    value confined to one box along a line leaves the rest of that box.
+    Returns the masks, or None once the puzzle is contradictory.
+    If stats is given it counts the candidates removed per rule and the 'passes' made.
+    """
+    L, K = input[0]
+    N = L * K
+    full = (1 << N) - 1
+    peers = cell_peers(L, K)
+    rows, cols, boxes = board_units(L, K)
+    units = rows + cols + boxes
+    box_of = [i // L * L + j // K for i in range(N) for j in range(N)]
+    masks = [full] * (N * N)
+    for x, y, val in input[1]:
+        masks[x * N + y] &= 1 << (val - 1)
+    pairs = [(x1 * N + y1, x2 * N + y2, target_sum) for x1, y1, x2, y2, target_sum in input[2]]
+    done = bytearray(N * N)
+    counts = Counter()
+
+    def restrict(cell: int, allowed: int, rule: str) -> None:
+        removed = masks[cell] & ~allowed
+        if removed:
+            counts[rule] += removed.bit_count()
+            masks[cell] ^= removed
+
+    def singles() -> bool:
+        for cell, mask in enumerate(masks):
+            if not done[cell] and not mask & (mask - 1):
+                done[cell] = 1
+                for peer in peers[cell]:
+                    restrict(peer, ~mask, 'naked_singles')
+        for unit in units:
+            once = twice = 0
+            for cell in unit:
+                twice |= once & masks[cell]
+                once |= masks[cell]
+            if once != full:
+                return False
+            only = once & ~twice
+            if only:
+                for cell in unit:
+                    mask = masks[cell] & only
+                    if mask & (mask - 1):
+                        return False
+                    if mask:
+                        restrict(cell, mask, 'hidden_singles')
+        for a, b, target_sum in pairs:
+            for cell, other in ((a, b), (b, a)):
+                allowed, mask = 0, masks[cell]
+                while mask:
+                    low = mask & -mask
+                    if 0 < target_sum - low.bit_length() <= N:
+                        allowed |= 1 << (target_sum - low.bit_length() - 1)
+                    mask ^= low
+                if other in peers[cell] and not target_sum % 2:
+                    allowed &= ~(1 << (target_sum // 2 - 1))
+                restrict(other, allowed, 'sums')
+        return True
+
+    def reductions() -> None:
+        for unit in units:
+            paired = {}
+            for cell in unit:
+                mask = masks[cell]
+                if mask.bit_count() == 2:
+                    if mask in paired:
+                        for other in unit:
+                            if other != cell and other != paired[mask]:
+                                restrict(other, ~mask, 'naked_pairs')
+                    paired[mask] = cell
+        for val in range(N):
+            bit = 1 << val
+            for box in boxes:
+                places = [cell for cell in box if masks[cell] & bit]
+                for line, lines in ((lambda cell: cell // N, rows), (lambda cell: cell % N, cols)):
+                    if places and len({line(cell) for cell in places}) == 1:
+                        for cell in lines[line(places[0])]:
+                            if box_of[cell] != box_of[places[0]]:
+                                restrict(cell, ~bit, 'box_line')
+            for line in rows + cols:
+                places = [cell for cell in line if masks[cell] & bit]
+                if places and len({box_of[cell] for cell in places}) == 1:
+                    inside = set(line)
+                    for cell in boxes[box_of[places[0]]]:
+                        if cell not in inside:
+                            restrict(cell, ~bit, 'box_line')
+
+    consistent = True
+    while consistent:
+        counts['passes'] += 1
+        removed = sum(counts[rule] for rule in PRESOLVE_RULES)
+        consistent = singles() and all(masks)
+        if consistent and removed == sum(counts[rule] for rule in PRESOLVE_RULES):
+            reductions()
+            consistent = all(masks)
+            if removed == sum(counts[rule] for rule in PRESOLVE_RULES):
+                break
+    if stats is not None:
+        stats.update(counts)
+    return masks if consistent else None
+
+
+def reduce_puzzle(input: Any, stats: Optional[dict] = None) -> Optional[list]:
+    """
+    The puzzle left after propagate_candidates, for a search to finish: every decided cell
+    becomes a given and only the sum constraints with an open cell stay. None if the puzzle
+    is contradictory; when the givens fill the board it is solved already.
+    """
+    masks = propagate_candidates(input, stats)
+    if masks is None:
+        return None
+    return puzzle_from_masks(input, masks)
+
+
+def puzzle_from_masks(input: Any, masks: list[int]) -> list:
+    """input with the cells decided in masks as its givens and the sum constraints still open."""
+    L, K = input[0]
     N = L * K
+    givens = [(*divmod(cell, N), mask.bit_length()) for cell, mask in enumerate(masks) if not mask & (mask - 1)]
+    sums = [constraint for constraint in input[2]
+            if masks[constraint[0] * N + constraint[1]].bit_count() > 1
+            or masks[constraint[2] * N + constraint[3]].bit_count() > 1]
+    return [input[0], givens, sums]
 
-    variables = [f'{i},{j},{v}' for i in range(N) for j in range(N) for v in range(1, N + 1)]
 
-    clauses = []
+def givens_board(input: Any) -> List[List[int]]:
+    """The board of a puzzle whose givens fill it, laid out like numbers_assignment's."""
+    L, K = input[0]
+    board = [[0] * (L * K) for _ in range(L * K)]
+    for i, j, val in input[1]:
+        board[i][j] = val
+    return board
 
-    # apply known locations:
-    for x, y, val in known_locations:
-        # add unit clause
-        clauses.append([(f'{x},{y},{val}', True)])
-        # set all other values for that cell to False
-        for other_val in range(1, N + 1):
-            if other_val != val:
-                # variables.remove(f'{x},{y},{other_val}')
-                # clauses.append([(f'{x},{y},{other_val}', False)])
-                pass
+
+def propagate_batch(problems: list, stats: Optional[dict] = None) -> tuple[Any, Any, Any]:
+    """
+    The naked single, hidden single and sum rules of propagate_candidates for B puzzles of
+    one shape at once: masks is a (B, N, N) uint64 array, each step updates every board
+    with whole-array operations, and the steps repeat until no board changes.
+    Returns (masks, solved, contradictory), the last two boolean arrays of length B;
+    boards that are neither are stuck. Needs NumPy; stats gets the number of 'passes'.
+    """
+    L, K = problems[0][0]
+    N = L * K
+    if any(tuple(problem[0]) != (L, K) for problem in problems):
+        raise ValueError('propagate_batch needs puzzles of one shape')
+    if N > 64:
+        raise ValueError(f'Boards of size {N} do not fit 64-bit candidate masks')
+    B = len(problems)
+    full = np.uint64((1 << N) - 1)
+    row, col = np.divmod(np.arange(N * N), N)
+    box_of = (row // L * L + col // K).reshape(N, N)
+    same_unit = lambda a, b: (a // N == b // N) | (a % N == b % N) | (box_of.ravel()[a] == box_of.ravel()[b])
+
+    masks = np.full((B, N, N), full, dtype=np.uint64)
+    givens = np.array([(b, x, y, val) for b, problem in enumerate(problems) for x, y, val in problem[1]],
+                      dtype=np.int64).reshape(-1, 4)
+    np.bitwise_and.at(masks, (givens[:, 0], givens[:, 1], givens[:, 2]),
+                      np.left_shift(np.uint64(1), (givens[:, 3] - 1).astype(np.uint64)))
+    sums = np.array([(b, x1 * N + y1, x2 * N + y2, target_sum) for b, problem in enumerate(problems)
+                     for x1, y1, x2, y2, target_sum in problem[2]], dtype=np.int64).reshape(-1, 4)
+    pair_board, first, second, target = sums.T
+    half = same_unit(first, second) & (target % 2 == 0) & (target >= 2) & (target <= 2 * N)
+    half_bit = np.where(half, np.left_shift(np.uint64(1), np.clip(target // 2 - 1, 0, N - 1).astype(np.uint64)), 0)
+
+    def per_unit(values):
+        """(B, 3N, N): the rows, then the columns, then the boxes of a (B, N, N) array."""
+        boxes = values.reshape(B, N // L, L, N // K, K).transpose(0, 1, 3, 2, 4).reshape(B, N, N)
+        return np.concatenate([values, values.transpose(0, 2, 1), boxes], axis=1)
+
+    def to_cells(units):
+        """OR of the (B, 3N) unit values over each cell's row, column and box, as (B, N, N)."""
+        return units[:, :N, None] | units[:, None, N:2 * N] | units[:, 2 * N:][:, box_of]
+
+    contradictory = np.zeros(B, dtype=bool)
+    passes = 0
+    while True:
+        passes += 1
+        before = masks
+        # naked singles - two equal singles in a unit sum to more than they OR to
+        single = (masks & (masks - np.uint64(1))) == 0
+        decided = per_unit(np.where(single, masks, np.uint64(0)))
+        union = np.bitwise_or.reduce(decided, axis=2)
+        contradictory |= (decided.sum(axis=2, dtype=np.uint64) != union).any(axis=1)
+        masks = np.where(single, masks, masks & ~to_cells(union))
+        # hidden singles
+        once = np.zeros((B, 3 * N), dtype=np.uint64)
+        twice = np.zeros_like(once)
+        for cell in np.moveaxis(per_unit(masks), 2, 0):
+            twice |= once & cell
+            once |= cell
+        contradictory |= (once != full).any(axis=1)
+        hit = masks & to_cells(once & ~twice)
+        contradictory |= ((hit & (hit - np.uint64(1))) != 0).any(axis=(1, 2))
+        masks = np.where(hit != 0, hit, masks)
+        # sum pairs keep complementary values, never half the target in two peers
+        flat = masks.reshape(B, N * N)
+        for source, other in ((first, second), (second, first)):
+            source_masks = flat[pair_board, source]
+            allowed = np.zeros(len(target), dtype=np.uint64)
+            for val in range(1, N + 1):
+                partner = target - val
+                possible = (partner >= 1) & (partner <= N) & ((source_masks >> np.uint64(val - 1)) & np.uint64(1) == 1)
+                allowed |= np.where(possible, np.left_shift(np.uint64(1), np.clip(partner - 1, 0, N - 1).astype(np.uint64)), 0)
+            np.bitwise_and.at(flat, (pair_board, other), allowed & ~half_bit)
+        contradictory |= (masks == 0).any(axis=(1, 2))
+        if np.array_equal(before, masks):
+            break
+    if stats is not None:
+        stats['passes'] = stats.get('passes', 0) + passes
+    solved = ((masks & (masks - np.uint64(1))) == 0).all(axis=(1, 2)) & ~contradictory
+    return masks, solved, contradictory
+
+
+# --- At-most-one encodings ---
+# Each encoder appends clauses forbidding two true literals in lits to clauses,
+# taking fresh auxiliary variables from new_var(). Short lists always use pairwise.
+AMO_METHODS = ('pairwise', 'sequential', 'commander', 'product', 'bimander')
+AMO_FAMILIES = ('cell', 'row', 'col', 'box')
+AMO_PAIRWISE_MAX = 4
+
+
+class VarPool:
+    """Hands out fresh variables above top: calling the pool returns the next unused one."""
+
+    def __init__(self, top: int):
+        self.top = top
+
+    def __call__(self) -> int:
+        self.top += 1
+        return self.top
+
+
+def amo_pairwise(lits: list, new_var, clauses: list) -> None:
+    """Binomial encoding: one binary clause per pair, no auxiliary variables."""
+    for a in range(len(lits)):
+        for b in range(a + 1, len(lits)):
+            clauses.append([-lits[a], -lits[b]])
+
+
+def amo_sequential(lits: list, new_var, clauses: list) -> None:
+    """Sinz sequential counter: s_i means 'one of lits[0..i] is true'. 3n clauses, n-1 variables."""
+    n = len(lits)
+    if n <= AMO_PAIRWISE_MAX:
+        return amo_pairwise(lits, new_var, clauses)
+    s = [new_var() for _ in range(n - 1)]
+    clauses.append([-lits[0], s[0]])
+    for i in range(1, n - 1):
+        clauses.append([-lits[i], s[i]])
+        clauses.append([-s[i - 1], s[i]])
+        clauses.append([-lits[i], -s[i - 1]])
+    clauses.append([-lits[n - 1], -s[n - 2]])
+
+
+def amo_commander(lits: list, new_var, clauses: list, group_size: int = 3) -> None:
+    """Klieber-Kwon commander encoding: pairwise inside groups, one commander per group, recursively."""
+    while len(lits) > AMO_PAIRWISE_MAX:
+        commanders = []
+        for start in range(0, len(lits), group_size):
+            group = lits[start:start + group_size]
+            if len(group) == 1:
+                commanders.append(group[0])
+                continue
+            commander = new_var()
+            amo_pairwise(group, new_var, clauses)
+            # commander <-> some literal of the group
+            for lit in group:
+                clauses.append([-lit, commander])
+            clauses.append([-commander] + group)
+            commanders.append(commander)
+        lits = commanders
+    amo_pairwise(lits, new_var, clauses)
+
+
+def amo_product(lits: list, new_var, clauses: list) -> None:
+    """Chen's 2-product encoding: literal k sits at (k // q, k % q) of a p x q grid, AMO on rows and columns."""
+    n = len(lits)
+    if n <= AMO_PAIRWISE_MAX:
+        return amo_pairwise(lits, new_var, clauses)
+    p = ceil(sqrt(n))
+    q = ceil(n / p)
+    rows = [new_var() for _ in range(ceil(n / q))]
+    cols = [new_var() for _ in range(q)]
+    for k, lit in enumerate(lits):
+        r, c = divmod(k, q)
+        clauses.append([-lit, rows[r]])
+        clauses.append([-lit, cols[c]])
+    amo_product(rows, new_var, clauses)
+    amo_product(cols, new_var, clauses)
+
+
+def amo_bimander(lits: list, new_var, clauses: list, group_size: int = 2) -> None:
+    """Bimander encoding: pairwise inside groups, each group gets a distinct binary code on log2(groups) bits."""
+    n = len(lits)
+    if n <= AMO_PAIRWISE_MAX:
+        return amo_pairwise(lits, new_var, clauses)
+    groups = [lits[start:start + group_size] for start in range(0, n, group_size)]
+    bits = [new_var() for _ in range(max(1, (len(groups) - 1).bit_length()))]
+    for g, group in enumerate(groups):
+        amo_pairwise(group, new_var, clauses)
+        for lit in group:
+            for k, bit in enumerate(bits):
+                clauses.append([-lit, bit if (g >> k) & 1 else -bit])
+
+
+AMO_ENCODERS = {
+    'pairwise': amo_pairwise,
+    'sequential': amo_sequential,
+    'commander': amo_commander,
+    'product': amo_product,
+    'bimander': amo_bimander,
+}
+
+
+def amo_choice(amo) -> dict:
+    """Normalizes the amo argument of to_CNF (one method, or a {family: method} dict) to a full dict."""
+    if isinstance(amo, str):
+        amo = {family: amo for family in AMO_FAMILIES}
+    choice = {family: amo.get(family, 'pairwise') for family in AMO_FAMILIES}
+    for family, method in choice.items():
+        if method not in AMO_ENCODERS:
+            raise ValueError(f'Unknown AMO encoding {method!r} for {family}, expected one of {AMO_METHODS}')
+    unknown = set(amo) - set(AMO_FAMILIES)
+    if unknown:
+        raise ValueError(f'Unknown constraint families {sorted(unknown)}, expected {AMO_FAMILIES}')
+    return choice
+
+
+def iter_structure(L: int, K: int, choice: dict, candidates: list, alive: bytearray,
+                   new_var: 'VarPool', families: dict):
+    """
+    Yields the puzzle-independent clauses (cell, row, column and box families) over the
+    encoded variables one at a time, candidates[i * N + j] being the values of cell (i, j)
+    and alive[var] marking encoded variables. Auxiliary variables come from new_var, and
+    families[family] is set to its (clause count, auxiliary variable count) once it is done.
+    """
+    N = L * K
+    buffer = []
 
     # Every square has exactly one number in it:
+    emitted, first_var = 0, new_var.top
+    encode = AMO_ENCODERS[choice['cell']]
     for i, j in product(range(N), range(N)):
-        # some value should be in the square - unit clause
-        clauses.append([(f'{i},{j},{val}', True) for val in range(1, N + 1)])
+        base = (i * N + j) * N
+        cell = [base + val for val in candidates[i * N + j]]
+        if not cell:
+            continue
+        # some value should be in the square
+        buffer.append(cell)
 
         # if some digit d is in the square then d' shouldn't be
-        for val1, val2 in product(range(1, N + 1), range(1, N + 1)):
-            if val1 < val2:
-                clauses.append([(f'{i},{j},{val1}', False), (f'{i},{j},{val2}', False)])
+        encode(cell, new_var, buffer)
+        emitted += len(buffer)
+        yield from buffer
+        buffer.clear()
+    families['cell'] = (emitted, new_var.top - first_var)
 
     # A number never appears twice in the same row:
+    emitted, first_var = 0, new_var.top
+    encode = AMO_ENCODERS[choice['row']]
     for digit in range(1, N + 1):
         for row in range(N):
-            for col1, col2 in product(range(N), range(N)):
-                if col1 < col2:
-                    clauses.append([(f'{row},{col1},{digit}', False), (f'{row},{col2},{digit}', False)])
+            lits = [(row * N + col) * N + digit for col in range(N)]
+            encode([lit for lit in lits if alive[lit]], new_var, buffer)
+            emitted += len(buffer)
+            yield from buffer
+            buffer.clear()
+    families['row'] = (emitted, new_var.top - first_var)
 
     # A number never appears twice in the same column:
+    emitted, first_var = 0, new_var.top
+    encode = AMO_ENCODERS[choice['col']]
     for digit in range(1, N + 1):
         for col in range(N):
-            for row1, row2 in product(range(N), range(N)):
-                if row1 < row2:
-                    clauses.append([(f'{row1},{col},{digit}', False), (f'{row2},{col},{digit}', False)])
+            lits = [(row * N + col) * N + digit for row in range(N)]
+            encode([lit for lit in lits if alive[lit]], new_var, buffer)
+            emitted += len(buffer)
+            yield from buffer
+            buffer.clear()
+    families['col'] = (emitted, new_var.top - first_var)
 
     # A number never appears twice in the same rectangle:
-    for i1, j1 in product(range(N), range(N)):
-        for i2, j2 in product(range(N), range(N)):
-            # Check if same box
-            same_box = (i1 // L == i2 // L) and (j1 // K == j2 // K)
-
-            # Ensure we only process pairs once (ordering)
-            valid_ordering = (i1 < i2 or (i1 == i2 and j1 < j2))
-
-            # REDUNDANCY CHECK: Skip if they share a row (i1==i2) or col (j1==j2)
-            # We only want diagonal relationships within the box here.
-            not_row_or_col = (i1 != i2) and (j1 != j2)
-
-            if same_box and valid_ordering and not_row_or_col:
-                for digit in range(1, N + 1):
-                    clauses.append([(f'{i1},{j1},{digit}', False), (f'{i2},{j2},{digit}', False)])
-    # sum constraints:
-    for constraint in sum_constraints:
+    emitted, first_var = 0, new_var.top
+    if choice['box'] == 'pairwise':
+        # Only pairs in different rows and columns - the rest are covered above.
+        for i1, j1 in product(range(N), range(N)):
+            box_row_end = (i1 // L + 1) * L
+            box_col_start = (j1 // K) * K
+            for i2 in range(i1 + 1, box_row_end):
+                for j2 in range(box_col_start, box_col_start + K):
+                    if j2 == j1:
+                        continue
+                    for digit in candidates[i1 * N + j1]:
+                        if alive[(i2 * N + j2) * N + digit]:
+                            emitted += 1
+                            yield [-((i1 * N + j1) * N + digit), -((i2 * N + j2) * N + digit)]
+    else:
+        # Auxiliary-variable encodings can't skip the row/col pairs, so they cover the whole box.
+        encode = AMO_ENCODERS[choice['box']]
+        for box_row, box_col in product(range(0, N, L), range(0, N, K)):
+            cells = [(i, j) for i in range(box_row, box_row + L) for j in range(box_col, box_col + K)]
+            for digit in range(1, N + 1):
+                lits = [(i * N + j) * N + digit for i, j in cells]
+                encode([lit for lit in lits if alive[lit]], new_var, buffer)
+                emitted += len(buffer)
+                yield from buffer
+                buffer.clear()
+    families['box'] = (emitted, new_var.top - first_var)
+
+
+def vectorized_structure(L: int, K: int, alive: bytearray) -> tuple[Any, Any, dict]:
+    """
+    NumPy form of iter_structure for the all-pairwise encoding: the same clauses in the same
+    order, as flat int32 literal and clause offset arrays (the ClauseArena layout).
+    A cell's candidates are its alive values, as reduced_domains lays them out.
+    Returns (lits, offsets, families).
+    """
+    N = L * K
+    var = np.arange(1, N * N * N + 1, dtype=np.int32).reshape(N, N, N)  # var[i, j, v - 1]
+    live = np.frombuffer(alive, dtype=np.uint8)[1:].reshape(N, N, N).astype(bool)
+    first, second = np.triu_indices(N, 1)
+    lits, lengths, families = [], [], {}
+
+    # cell: the at-least-one clause then the pairs of each cell, cells without candidates skipped
+    cells, cell_live = var.reshape(N * N, N), live.reshape(N * N, N)
+    pair_live = cell_live[:, first] & cell_live[:, second]
+    pairs = -np.stack([cells[:, first], cells[:, second]], axis=2).reshape(N * N, -1)
+    lits.append(np.concatenate([cells, pairs], axis=1)[
+        np.concatenate([cell_live, np.repeat(pair_live, 2, axis=1)], axis=1)])
+    count = cell_live.sum(axis=1, dtype=np.int32)
+    clause_lengths = np.concatenate([count[:, None], np.full(pair_live.shape, 2, dtype=np.int32)], axis=1)
+    lengths.append(clause_lengths[np.concatenate([count[:, None] > 0, pair_live], axis=1)])
+    families['cell'] = (len(lengths[-1]), 0)
+
+    # row and col: lines[digit, line, k] is the k-th variable of that digit along the line
+    for family, axes in (('row', (2, 0, 1)), ('col', (2, 1, 0))):
+        lines, line_live = var.transpose(axes), live.transpose(axes)
+        mask = line_live[..., first] & line_live[..., second]
+        lits.append(-np.stack([lines[..., first][mask], lines[..., second][mask]], axis=1).ravel())
+        lengths.append(np.full(int(mask.sum()), 2, dtype=np.int32))
+        families[family] = (len(lengths[-1]), 0)
+
+    # box: cell pairs sharing a box id, the second one in a later row and another column
+    row, col = np.divmod(np.arange(N * N), N)
+    box = row // L * L + col // K
+    c1, c2 = np.nonzero((box[:, None] == box[None, :]) & (row[:, None] < row[None, :])
+                        & (col[:, None] != col[None, :]))
+    mask = cell_live[c1] & cell_live[c2]
+    lits.append(-np.stack([cells[c1][mask], cells[c2][mask]], axis=1).ravel())
+    lengths.append(np.full(int(mask.sum()), 2, dtype=np.int32))
+    families['box'] = (len(lengths[-1]), 0)
+
+    lits = np.concatenate(lits)
+    offsets = np.zeros(sum(map(len, lengths)) + 1, dtype=np.int32)
+    np.cumsum(np.concatenate(lengths), out=offsets[1:])
+    return lits, offsets, families
+
+
+def encode_structure(L: int, K: int, choice: dict, candidates: list, alive: bytearray,
+                     container=list) -> tuple[list, int, dict]:
+    """
+    Collects the structural clauses of iter_structure into container (a list, or ClauseArena).
+    Returns (clauses, top, families): top is the largest variable used (auxiliary ones
+    included) and families maps each family to its (clause count, auxiliary variable count).
+    An all-pairwise arena is built by vectorized_structure when NumPy is available - lists
+    are not, creating the clause objects costs more than generating them.
+    """
+    if container is ClauseArena and np is not None and all(method == 'pairwise' for method in choice.values()):
+        lits, offsets, families = vectorized_structure(L, K, alive)
+        return ClauseArena.from_buffers(lits, offsets), L * K * L * K * L * K, families
+    new_var = VarPool(L * K * L * K * L * K)
+    families = {}
+    clauses = container(iter_structure(L, K, choice, candidates, alive, new_var, families))
+    return clauses, new_var.top, families
+
+
+CNFTemplate = namedtuple('CNFTemplate', ['variables', 'clauses', 'top', 'families'])
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class TemplateCache:
+    """
+    Thread-safe LRU cache of CNFTemplate keyed by (L, K, encoding, amo choice).
+    Template clauses are tuples shared by every to_CNF call of that shape - treat them as read-only
+    (an 'arena' template is a ClauseArena, copied into each formula).
+    The cache lives in one process: a check.timeout_exec child drops what it adds on exit,
+    solve_many's long-lived workers keep their templates across puzzles.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, L: int, K: int, encoding: str, choice: dict) -> CNFTemplate:
+        key = (L, K, encoding, tuple(sorted(choice.items())))
+        # Building under the lock keeps two threads from encoding the same shape twice
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self.hits += 1
+                self._templates.move_to_end(key)
+                return template
+            self.misses += 1
+            template = build_template(L, K, encoding, choice)
+            self._templates[key] = template
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+            return template
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._templates))
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self.hits = self.misses = 0
+
+
+def build_template(L: int, K: int, encoding: str, choice: dict) -> CNFTemplate:
+    """Encodes the structural block of an L x K shape over the full variable space."""
+    N = L * K
+    candidates = [list(range(1, N + 1))] * (N * N)
+    alive = bytearray([1]) * (N * N * N + 1)
+    variables = BoardVariables(range(1, N * N * N + 1), N)
+    if encoding == 'arena':
+        clauses, top, families = encode_structure(L, K, choice, candidates, alive, ClauseArena)
+        return CNFTemplate(tuple(variables), clauses, top, families)
+    clauses, top, families = encode_structure(L, K, choice, candidates, alive)
+    if encoding == 'str':
+        variables, clauses = to_string_form(variables, clauses, N, top)
+    return CNFTemplate(tuple(variables), tuple(map(tuple, clauses)), top, families)
+
+
+TEMPLATE_CACHE = TemplateCache()
+
+
+def reduced_domains(input: Any) -> tuple[BoardVariables, list, bytearray, bool]:
+    """
+    Runs reduce_domains and lays the result out for encoding.
+    Returns (variables, candidates, alive, consistent): candidates[i * N + j] are the values
+    still encoded for cell (i, j) (none for decided cells), alive[var] marks encoded variables
+    and consistent is False when some cell has no value left.
+    """
+    L, K = input[0]
+    N = L * K
+    domains = reduce_domains(input)
+    decided = {divmod(cell, N): next(iter(domain)) for cell, domain in enumerate(domains) if len(domain) == 1}
+    candidates = [sorted(domain) if len(domain) > 1 else [] for domain in domains]
+    alive = bytearray(N * N * N + 1)
+    for cell, values in enumerate(candidates):
+        for val in values:
+            alive[cell * N + val] = 1
+    variables = BoardVariables((var for var in range(1, N * N * N + 1) if alive[var]), N, decided)
+    return variables, candidates, alive, all(domains)
+
+
+def iter_givens(input: Any):
+    """Yields the unit clause of every pre-filled cell."""
+    L, K = input[0]
+    N = L * K
+    for x, y, val in input[1]:
+        yield [(x * N + y) * N + val]
+
+
+def iter_sums(input: Any, candidates: list, alive: Optional[bytearray]):
+    """Yields the clauses of the sum constraints, restricted to the encoded candidates."""
+    L, K = input[0]
+    N = L * K
+    for constraint in input[2]:
         x1, y1, x2, y2, target_sum = constraint
-        for val in range(1, N + 1):
-            if target_sum - val >= 1 and target_sum - val <= N:
-                clauses.append([(f'{x1},{y1},{val}', False), (f'{x2},{y2},{target_sum - val}', True)])
-                clauses.append([(f'{x1},{y1},{val}', True), (f'{x2},{y2},{target_sum - val}', False)])
+        base1 = (x1 * N + y1) * N
+        base2 = (x2 * N + y2) * N
+        for val in candidates[x1 * N + y1]:
+            if target_sum - val >= 1 and target_sum - val <= N and (alive is None or alive[base2 + target_sum - val]):
+                yield [-(base1 + val), base2 + target_sum - val]
+                yield [base1 + val, -(base2 + target_sum - val)]
             else:
-                clauses.append([(f'{x1},{y1},{val}', False)])
+                yield [-(base1 + val)]
+
+
+def to_CNF(input: list[tuple[int, int], tuple[int, int, int], tuple[int, int, int, int, int]],
+           encoding: str = 'str', amo='pairwise', reduce: bool = False,
+           cache: Optional[TemplateCache] = TEMPLATE_CACHE, stats: Optional[dict] = None) -> tuple[list, list]:
+    """
+    Encodes the puzzle as CNF.
+    encoding='str' returns 'row,col,val' variables with (name, bool) literals,
+    encoding='int' returns BoardVariables of ints with signed int literals,
+    encoding='arena' the same variables with the clauses packed in a ClauseArena.
+    amo picks the at-most-one encoding, either for all families or per family
+    ({'cell': ..., 'row': ..., 'col': ..., 'box': ...}, missing ones stay pairwise).
+    Auxiliary variables of non-pairwise encodings appear only in the clauses, never in variables.
+    reduce runs reduce_domains first: impossible (cell, value) pairs and decided cells
+    are left out entirely, decided cells are kept in variables.decided for numbers_assignment.
+    Without reduce the structural clauses come from cache (shared read-only tuples),
+    pass cache=None to rebuild them.
+    If stats is given it is filled with clause and variable counts per family.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding {encoding!r}, expected one of {ENCODINGS}')
+    choice = amo_choice(amo)
+
+    # print(input)
+    L, K = input[0]
+    N = L * K
+
+    # Clauses are always built with int literals - formatting strings per literal
+    # is the expensive part, so the string form is produced from a name table at the end.
+    if reduce:
+        variables, candidates, alive, consistent = reduced_domains(input)
+        structure, top, families = encode_structure(L, K, choice, candidates, alive,
+                                                    ClauseArena if encoding == 'arena' else list)
+        givens = []
+    else:
+        candidates, alive, consistent = [range(1, N + 1)] * (N * N), None, True
+        template = cache.get(L, K, encoding, choice) if cache is not None else None
+        if template is None:
+            template = build_template(L, K, encoding, choice)
+        variables = BoardVariables(template.variables, N)
+        structure, top, families = template.clauses, template.top, template.families
+        givens = list(iter_givens(input))
+    sums = list(iter_sums(input, candidates, alive))
+
+    if encoding == 'str':
+        # only the per-puzzle clauses still need converting; a reduced structure is converted here as well
+        _, positive, negative = literal_table(N, top)
+        givens = [[positive[lit] for lit in clause] for clause in givens]
+        sums = [[positive[lit] if lit > 0 else negative[-lit] for lit in clause] for clause in sums]
+        if reduce:
+            variables, structure = to_string_form(variables, structure, N, top)
+
+    clauses = ClauseArena(givens) if encoding == 'arena' else givens
+    if not consistent:
+        # some cell has no candidate left - the empty clause makes the formula unsatisfiable
+        clauses.append([])
+    clauses.extend(structure)
+    clauses.extend(sums)
+
+    if stats is not None:
+        stats['families'] = {family: {'amo': choice[family], 'clauses': num_clauses, 'aux_variables': num_aux}
+                             for family, (num_clauses, num_aux) in families.items()}
+        stats['clauses'] = len(clauses)
+        stats['aux_variables'] = top - N * N * N
+        stats['variables'] = len(variables) + stats['aux_variables']
+        stats['decided_cells'] = len(variables.decided)
 
     # print(f'CNF has {len(clauses)} clauses and {len(variables)} variables')
     return variables, clauses
 
 
+def iter_CNF(input: Any, amo='pairwise', reduce: bool = False, stats: Optional[dict] = None) -> tuple[list, Any]:
+    """
+    Streaming form of to_CNF(input, encoding='int'): returns (variables, clauses) where
+    clauses is a generator yielding the same clauses in the same order, one at a time,
+    without ever holding the formula in memory.
+    stats is filled once the generator is exhausted, 'top' being the largest variable used.
+    """
+    choice = amo_choice(amo)
+    L, K = input[0]
+    N = L * K
+    if reduce:
+        variables, candidates, alive, consistent = reduced_domains(input)
+    else:
+        variables = BoardVariables(range(1, N * N * N + 1), N)
+        candidates, alive, consistent = [range(1, N + 1)] * (N * N), bytearray([1]) * (N * N * N + 1), True
+
+    def clauses():
+        new_var = VarPool(N * N * N)
+        families = {}
+        emitted = 0
+        if not reduce:
+            for clause in iter_givens(input):
+                emitted += 1
+                yield clause
+        if not consistent:
+            emitted += 1
+            yield []
+        for clause in iter_structure(L, K, choice, candidates, alive, new_var, families):
+            emitted += 1
+            yield clause
+        for clause in iter_sums(input, candidates, alive):
+            emitted += 1
+            yield clause
+
+        if stats is not None:
+            stats['families'] = {family: {'amo': choice[family], 'clauses': num_clauses, 'aux_variables': num_aux}
+                                 for family, (num_clauses, num_aux) in families.items()}
+            stats['clauses'] = emitted
+            stats['aux_variables'] = new_var.top - N * N * N
+            stats['variables'] = len(variables) + stats['aux_variables']
+            stats['decided_cells'] = len(variables.decided)
+            stats['top'] = new_var.top
+
+    return variables, clauses()
+
+
+# wide enough for any count, so the patched header never overruns the first clause
+DIMACS_HEADER = 'p cnf {:<12d} {:<12d}\n'
+
+
+def write_DIMACS(input: Any, file, amo='pairwise', reduce: bool = False) -> dict:
+    """
+    Streams the integer encoding of input to a DIMACS .cnf file (a path or a seekable
+    text file) without building the clause list. The 'p cnf' header is written as a
+    fixed-width placeholder and patched once the counts are known.
+    Cells decided by reduce are recorded as 'c decided row col val' comments.
+    Returns the stats of iter_CNF.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'w', encoding='ascii') as f:
+            return write_DIMACS(input, f, amo=amo, reduce=reduce)
+
+    stats = {}
+    variables, clauses = iter_CNF(input, amo=amo, reduce=reduce, stats=stats)
+    L, K = input[0]
+    file.write(f'c sudoku {L}x{K}, variable (row * N + col) * N + val with N = {L * K}\n')
+    for (i, j), v in sorted(variables.decided.items()):
+        file.write(f'c decided {i} {j} {v}\n')
+    header_at = file.tell()
+    file.write(DIMACS_HEADER.format(0, 0))
+    for clause in clauses:
+        file.write(' '.join(map(str, clause)) + ' 0\n' if clause else '0\n')
+    end = file.tell()
+    file.seek(header_at)
+    file.write(DIMACS_HEADER.format(stats['top'], stats['clauses']))
+    file.seek(end)
+    return stats
+
+
+def amo_report(input: Any, methods=AMO_METHODS, solve: bool = False) -> dict:
+    """
+    Encodes input once per AMO method (applied to every family) and returns
+    {method: stats} with the clause/variable counts of to_CNF plus 'encode_seconds',
+    and 'solve_seconds' / 'satisfiable' when solve is set.
+    """
+    report = {}
+    for method in methods:
+        stats = {}
+        t0 = time.perf_counter()
+        variables, clauses = to_CNF(input, encoding='int', amo=method, cache=None, stats=stats)
+        stats['encode_seconds'] = time.perf_counter() - t0
+        if solve:
+            t0 = time.perf_counter()
+            stats['satisfiable'], _ = solve_SAT(variables, clauses, {})
+            stats['solve_seconds'] = time.perf_counter() - t0
+        report[method] = stats
+    return report
+
+
 '''
 def unit_propogation(variables, CNF_formula, assignment):
     while True:
@@ -141,13 +1091,14 @@ def unit_propogation(variables, CNF_formula, assignment):
 
 def unit_propogation(variables, CNF_formula, assignment):
     current_formula = CNF_formula
+    status_of = int_clause_status if is_int_form(variables, CNF_formula) else clause_status
 
     while True:
         units = []
         new_formula = []
 
         for clause in current_formula:
-            status, value = clause_status(clause, assignment)
+            status, value = status_of(clause, assignment)
 
             if status == "conflict":
                 return False, [], []
@@ -182,7 +1133,2082 @@ def unit_propogation(variables, CNF_formula, assignment):
             return True, assignment, []
 
 
-def solve_SAT(variables, CNF_formula, assignment) -> tuple[bool, list]:
+# --- Watched-literal engine ---
+
+VAR_DECAY = 0.95
+CLAUSE_DECAY = 0.999
+
+
+class Clause(list):
+    """A learned clause: a list of literals with its activity and literal block distance."""
+    __slots__ = ('activity', 'lbd')
+
+    def __init__(self, lits, lbd: int):
+        super().__init__(lits)
+        self.activity = 0.0
+        self.lbd = lbd
+
+
+class Solver:
+    """
+    Propagation engine over integer literals +-1..num_vars.
+    value[lit] is True / False / None for either polarity - the list has 2 * num_vars + 1
+    slots, so a negative literal indexes it from the end.
+    Binary clauses become implications - the literals forced true once p is true. Those of a
+    ClauseArena formula are counted first and packed in one CSR array, binary[binary_start[s]:
+    binary_end[s]] for the value slot s of p; later ones (learned, added, or from any other
+    formula) go to implied[p]. implications(p) gives both.
+    Longer clauses watch their first two literals: watches[p] holds the clauses that watch -p
+    and have to be visited once p becomes true.
+    implied[p] and watches[p] start out as the shared empty tuple and become an array or a
+    list on their first entry, so literals without any cost no container.
+    reason[var] is what implied var: None for decisions and level-0 facts, the true literal
+    p for a binary clause (-p or var), or the clause itself.
+    listeners are told backtrack(mark) before the trail is cut back to mark, and
+    new_var(var) once new_var() added a variable.
+    With phase saving on, phase[var] remembers the last value var had before backtracking.
+    """
+
+    def __init__(self, num_vars: int, clauses=()):
+        size = 2 * num_vars + 1
+        self.num_vars = num_vars
+        self.value = [None] * size
+        # binary clauses are most of a sudoku formula - arrays keep them at 4 bytes a literal
+        self.binary = array('i')
+        self.binary_start = array('i', [0]) * (size + 1)
+        self.binary_end = array('i', [0]) * (size + 1)
+        self.implied = [()] * size
+        self.watches = [()] * size
+        self.clauses = []
+        self.learnts = []
+        self.level = [0] * (num_vars + 1)
+        self.reason = [None] * (num_vars + 1)
+        self.seen = bytearray(num_vars + 1)
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.activity = [0.0] * (num_vars + 1)
+        self.var_inc = 1.0
+        self.order = None
+        self.phase = None
+        self.listeners = []
+        self.clause_inc = 1.0
+        self.max_learnts = 0
+        self.stats = Counter()
+        self.ok = True
+        if isinstance(clauses, ClauseArena):
+            self.reserve_binaries(clauses)
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def reserve_binaries(self, arena: ClauseArena) -> None:
+        """Sizes the CSR implication store for the binary clauses of arena before they are added."""
+        lits, offsets, size = arena.lits, arena.offsets, len(self.value)
+        if np is not None:
+            offsets = np.frombuffer(offsets, dtype=np.int32)
+            begin = offsets[:-1][np.diff(offsets) == 2]
+            implying = -np.frombuffer(lits, dtype=np.int32)[np.concatenate([begin, begin + 1])]
+            count = np.bincount(np.where(implying > 0, implying, size + implying), minlength=size)
+            self.binary_start = array('i', np.concatenate([[0], np.cumsum(count)]).astype(np.int32).tobytes())
+        else:
+            count = array('i', [0]) * (size + 1)
+            for begin, end in zip(offsets, islice(offsets, 1, None)):
+                if end - begin == 2:
+                    a, b = lits[begin], lits[begin + 1]
+                    count[-a if a < 0 else size - a] += 1
+                    count[-b if b < 0 else size - b] += 1
+            start = self.binary_start
+            for slot in range(size):
+                start[slot + 1] = start[slot] + count[slot]
+        start = self.binary_start
+        self.binary_end = array('i', start)
+        self.binary = array('i', [0]) * start[size]
+
+    def imply(self, p: int, q: int) -> None:
+        """Records that p implies q (half of the binary clause -p or q)."""
+        slot = p if p > 0 else len(self.value) + p
+        end = self.binary_end[slot]
+        if end < self.binary_start[slot + 1]:
+            self.binary[end] = q
+            self.binary_end[slot] = end + 1
+        elif self.implied[p]:
+            self.implied[p].append(q)
+        else:
+            self.implied[p] = array('i', [q])
+
+    def implications(self, p: int) -> array:
+        """Every literal the binary clauses force once p is true."""
+        slot = p if p > 0 else len(self.value) + p
+        lits = self.binary[self.binary_start[slot]:self.binary_end[slot]]
+        if self.implied[p]:
+            lits += self.implied[p]
+        return lits
+
+    def watch(self, lit: int, clause: list) -> None:
+        """Makes clause watch lit, visited once lit is false."""
+        watching = self.watches[-lit]
+        if watching:
+            watching.append(clause)
+        else:
+            self.watches[-lit] = [clause]
+
+    def add_clause(self, lits) -> bool:
+        """Adds a clause before search. Returns False once the formula is known to be unsatisfiable."""
+        clause = list(dict.fromkeys(lits))
+        present = set(clause)
+        if any(-lit in present for lit in clause):
+            return self.ok
+        value = self.value
+        clause = [lit for lit in clause if value[lit] is not False]
+        if any(value[lit] for lit in clause):
+            return self.ok
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.enqueue(clause[0])
+        elif len(clause) == 2:
+            a, b = clause
+            self.imply(-a, b)
+            self.imply(-b, a)
+        else:
+            self.watch(clause[0], clause)
+            self.watch(clause[1], clause)
+            self.clauses.append(clause)
+        return self.ok
+
+    def enqueue(self, lit: int, reason=None) -> bool:
+        """Makes lit true unless it is false already. Propagation happens in propagate()."""
+        value = self.value
+        if value[lit] is not None:
+            return value[lit]
+        value[lit] = True
+        value[-lit] = False
+        var = abs(lit)
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+        return True
+
+    def decision_level(self) -> int:
+        return len(self.trail_lim)
+
+    def polarity(self, var: int) -> int:
+        """The literal to decide on for var: its saved phase when phase saving is on, else True."""
+        if self.phase is None or self.phase[var]:
+            return var
+        return -var
+
+    def decide(self, lit: int) -> None:
+        """Opens a new decision level with lit as its decision."""
+        self.stats['decisions'] += 1
+        self.trail_lim.append(len(self.trail))
+        self.enqueue(lit)
+
+    def cancel_until(self, level: int) -> None:
+        """Backtracks to decision level level, unassigning everything decided or implied above it."""
+        if len(self.trail_lim) > level:
+            self.undo(self.trail_lim[level])
+            del self.trail_lim[level:]
+
+    def propagate(self) -> Optional[list]:
+        """Propagates the trail from qhead to a fixpoint. Returns the conflicting clause, or None."""
+        value, trail, watches, implied = self.value, self.trail, self.watches, self.implied
+        binary, binary_start, binary_end, size = self.binary, self.binary_start, self.binary_end, len(self.value)
+        level, reason, current = self.level, self.reason, len(self.trail_lim)
+        start = self.qhead
+        while self.qhead < len(trail):
+            p = trail[self.qhead]
+            self.qhead += 1
+            slot = p if p > 0 else size + p
+            forced = binary[binary_start[slot]:binary_end[slot]]
+            if implied[p]:
+                forced += implied[p]
+            for q in forced:
+                if value[q] is None:
+                    value[q] = True
+                    value[-q] = False
+                    level[abs(q)] = current
+                    reason[abs(q)] = p
+                    trail.append(q)
+                elif value[q] is False:
+                    self.stats['propagations'] += self.qhead - start
+                    self.qhead = len(trail)
+                    return [q, -p]
+
+            false_lit = -p
+            watching = watches[p]
+            if not watching:
+                continue
+            kept = []
+            for n, clause in enumerate(watching):
+                # keep the false watch in slot 1
+                if clause[0] == false_lit:
+                    clause[0] = clause[1]
+                    clause[1] = false_lit
+                first = clause[0]
+                if value[first] is True:
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    lit = clause[k]
+                    if value[lit] is not False:
+                        clause[1] = lit
+                        clause[k] = false_lit
+                        if watches[-lit]:
+                            watches[-lit].append(clause)
+                        else:
+                            watches[-lit] = [clause]
+                        break
+                else:
+                    kept.append(clause)
+                    if value[first] is False:
+                        kept.extend(watching[n + 1:])
+                        watches[p] = kept
+                        self.stats['propagations'] += self.qhead - start
+                        self.qhead = len(trail)
+                        return clause
+                    value[first] = True
+                    value[-first] = False
+                    level[abs(first)] = current
+                    reason[abs(first)] = clause
+                    trail.append(first)
+            watches[p] = kept
+        self.stats['propagations'] += self.qhead - start
+        return None
+
+    def undo(self, mark: int) -> None:
+        """Unassigns every literal the trail gained after position mark."""
+        value, trail, order, phase = self.value, self.trail, self.order, self.phase
+        for lit in trail[mark:]:
+            value[lit] = None
+            value[-lit] = None
+        if phase is not None:
+            for lit in trail[mark:]:
+                phase[abs(lit)] = lit > 0
+        if order is not None:
+            for lit in trail[mark:]:
+                order.push(abs(lit))
+        for listener in self.listeners:
+            listener.backtrack(mark)
+        del trail[mark:]
+        self.qhead = len(trail)
+
+    def new_var(self) -> int:
+        """Adds a variable at level 0, e.g. an activation literal between two searches. Returns it."""
+        var = self.num_vars = self.num_vars + 1
+        # the new positive slot goes at var and the new negative one right after it, so the
+        # old negative literals, indexed from the end, keep their slots
+        self.value[var:var] = [None, None]
+        self.implied[var:var] = [(), ()]
+        self.watches[var:var] = [(), ()]
+        # two empty CSR slots, so the regions of the slots after them stay where they are
+        self.binary_start[var:var] = array('i', [self.binary_start[var]] * 2)
+        self.binary_end[var:var] = array('i', [self.binary_start[var]] * 2)
+        self.level.append(0)
+        self.reason.append(None)
+        self.seen.append(0)
+        self.activity.append(0.0)
+        if self.phase is not None:
+            self.phase.append(True)
+        if self.order is not None:
+            self.order.resize()
+            self.order.push(var)
+        for listener in self.listeners:
+            listener.new_var(var)
+        return var
+
+    def simplify(self) -> None:
+        """At level 0, after propagation: drops every clause satisfied for good."""
+        value, implied, watches = self.value, self.implied, self.watches
+        live = lambda clause: not any(value[q] for q in clause)
+        before = len(self.clauses) + len(self.learnts)
+        self.clauses = list(filter(live, self.clauses))
+        self.learnts = list(filter(live, self.learnts))
+        binary, binary_start, binary_end, size = self.binary, self.binary_start, self.binary_end, len(value)
+        for p in range(-self.num_vars, self.num_vars + 1):
+            if watches[p]:
+                watches[p] = list(filter(live, watches[p]))
+            # an assigned p satisfies or already propagated its binary clauses, and so does an assigned q
+            if implied[p]:
+                implied[p] = () if value[p] is not None else array('i', (q for q in implied[p] if value[q] is None))
+            slot = p if p > 0 else size + p
+            kept = binary_start[slot]
+            if value[p] is None:
+                for k in range(binary_start[slot], binary_end[slot]):
+                    if value[binary[k]] is None:
+                        binary[kept] = binary[k]
+                        kept += 1
+            binary_end[slot] = kept
+        self.stats['simplified'] += before - len(self.clauses) - len(self.learnts)
+
+    def first_unassigned(self) -> Optional[int]:
+        value = self.value
+        for var in range(1, self.num_vars + 1):
+            if value[var] is None:
+                return var
+        return None
+
+    # --- conflict analysis ---
+
+    def reason_lits(self, var: int) -> list:
+        """The false literals of the clause that implied var."""
+        reason = self.reason[var]
+        if isinstance(reason, int):
+            return [-reason]
+        lit = var if self.value[var] else -var
+        return [q for q in reason if q != lit]
+
+    # --- VSIDS ---
+
+    def use_order_heap(self) -> None:
+        """Keeps the unassigned variables in an activity-ordered heap for pick_VSIDS."""
+        self.order = IndexedMaxHeap(self.activity, (var for var in range(1, self.num_vars + 1)
+                                                    if self.value[var] is None))
+
+    def bump_variable(self, var: int) -> None:
+        """Raises the activity of a variable taking part in a conflict."""
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > 1e100:
+            for k in range(1, self.num_vars + 1):
+                activity[k] *= 1e-100
+            self.var_inc *= 1e-100
+        if self.order is not None:
+            self.order.increase(var)
+
+    def decay_activities(self) -> None:
+        """EVSIDS: instead of decaying every activity, later bumps are worth more."""
+        self.var_inc /= VAR_DECAY
+        self.clause_inc /= CLAUSE_DECAY
+
+    def analyze(self, conflict: list) -> tuple[list, int]:
+        """
+        First-UIP conflict analysis. Returns the minimized learned clause, asserting literal
+        first and a literal of the backjump level second, together with that level.
+        """
+        seen, level, trail = self.seen, self.level, self.trail
+        current = len(self.trail_lim)
+        learnt = [0]
+        pending = 0
+        p = None
+        clause = conflict
+        index = len(trail) - 1
+        while True:
+            if isinstance(clause, Clause):
+                self.bump_clause(clause)
+            for q in clause:
+                var = abs(q)
+                if q == p or seen[var] or not level[var]:
+                    continue
+                seen[var] = 1
+                self.bump_variable(var)
+                if level[var] == current:
+                    pending += 1
+                else:
+                    learnt.append(q)
+            # walk the trail back to the next marked literal of the current level
+            while not seen[abs(trail[index])]:
+                index -= 1
+            p = trail[index]
+            index -= 1
+            seen[abs(p)] = 0
+            pending -= 1
+            if not pending:
+                break
+            reason = self.reason[abs(p)]
+            clause = [p, -reason] if isinstance(reason, int) else reason
+        learnt[0] = -p
+
+        learnt = self.minimize(learnt)
+
+        if len(learnt) == 1:
+            return learnt, 0
+        # the literal of the highest remaining level is watched second
+        best = max(range(1, len(learnt)), key=lambda k: level[abs(learnt[k])])
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, level[abs(learnt[1])]
+
+    def minimize(self, learnt: list) -> list:
+        """Drops literals implied by the rest of the clause (recursive minimization)."""
+        seen, level, reason = self.seen, self.level, self.reason
+        levels = 0
+        for q in learnt[1:]:
+            levels |= 1 << (level[abs(q)] & 63)
+        marked = [abs(q) for q in learnt[1:]]
+        kept = [learnt[0]]
+        for q in learnt[1:]:
+            if reason[abs(q)] is None or not self.redundant(q, levels, marked):
+                kept.append(q)
+        for var in marked:
+            seen[var] = 0
+        self.stats['minimized_literals'] += len(learnt) - len(kept)
+        return kept
+
+    def redundant(self, lit: int, levels: int, marked: list) -> bool:
+        """True when lit follows from literals already in the learned clause (marked in seen)."""
+        seen, level, reason = self.seen, self.level, self.reason
+        stack = [abs(lit)]
+        top = len(marked)
+        while stack:
+            for q in self.reason_lits(stack.pop()):
+                var = abs(q)
+                if seen[var] or not level[var]:
+                    continue
+                if reason[var] is not None and (1 << (level[var] & 63)) & levels:
+                    seen[var] = 1
+                    stack.append(var)
+                    marked.append(var)
+                else:
+                    for var in marked[top:]:
+                        seen[var] = 0
+                    del marked[top:]
+                    return False
+        return True
+
+    def learn(self, learnt: list) -> int:
+        """Adds a learned clause after backjumping and asserts its first literal. Returns its LBD."""
+        self.stats['learned'] += 1
+        # levels are still those of the conflict - backjumping doesn't clear them
+        lbd = len({self.level[abs(q)] for q in learnt})
+        if len(learnt) == 1:
+            self.enqueue(learnt[0])
+            return lbd
+        if len(learnt) == 2:
+            a, b = learnt
+            self.imply(-a, b)
+            self.imply(-b, a)
+            self.enqueue(a, -b)
+            return lbd
+        clause = Clause(learnt, lbd)
+        self.bump_clause(clause)
+        self.watch(clause[0], clause)
+        self.watch(clause[1], clause)
+        self.learnts.append(clause)
+        self.enqueue(clause[0], clause)
+        return lbd
+
+    def bump_clause(self, clause: Clause) -> None:
+        clause.activity += self.clause_inc
+        if clause.activity > 1e20:
+            for learnt in self.learnts:
+                learnt.activity *= 1e-20
+            self.clause_inc *= 1e-20
+
+    def reduce_db(self) -> None:
+        """
+        Deletes the worse half of the learned clauses, by LBD then activity.
+        Glue clauses (LBD <= 2) and clauses that are the reason of an assignment stay.
+        """
+        reason, value = self.reason, self.value
+        self.learnts.sort(key=lambda c: (c.lbd, -c.activity))
+        keep_count = len(self.learnts) // 2
+        kept, removed = [], set()
+        for k, clause in enumerate(self.learnts):
+            locked = value[clause[0]] and reason[abs(clause[0])] is clause
+            if k < keep_count or clause.lbd <= 2 or locked:
+                kept.append(clause)
+            else:
+                removed.add(id(clause))
+        if removed:
+            for p in range(-self.num_vars, self.num_vars + 1):
+                if self.watches[p]:
+                    self.watches[p] = [c for c in self.watches[p] if id(c) not in removed]
+        self.stats['deleted'] += len(removed)
+        self.learnts = kept
+
+
+class CellBuckets:
+    """
+    Incremental MRV: unassigned-variable counts per board cell, kept in buckets by count.
+    buckets[c] is a bitset of the cells with exactly c unassigned variables, so the most
+    constrained cell is the lowest set bit of the first non-empty bucket - the same cell
+    a full scan in cell order would choose. Counts follow the trail lazily: assignments are
+    taken in on pick(), and backtrack() (a Solver listener) gives back the ones undone.
+    """
+
+    def __init__(self, solver: Solver, cells: list):
+        self.solver = solver
+        self.cells = cells
+        self.cell_of = [-1] * (solver.num_vars + 1)
+        for index, cell in enumerate(cells):
+            for var in cell:
+                self.cell_of[var] = index
+        self.count = [len(cell) for cell in cells]
+        self.buckets = [0] * (max(self.count, default=0) + 1)
+        for index, count in enumerate(self.count):
+            self.buckets[count] |= 1 << index
+        self.synced = 0
+        solver.listeners.append(self)
+
+    def backtrack(self, mark: int) -> None:
+        if mark < self.synced:
+            self._shift(self.solver.trail[mark:self.synced], 1)
+            self.synced = mark
+
+    def new_var(self, var: int) -> None:
+        self.cell_of.append(-1)
+
+    def _shift(self, lits, delta: int) -> None:
+        count, buckets, cell_of = self.count, self.buckets, self.cell_of
+        for lit in lits:
+            cell = cell_of[abs(lit)]
+            if cell >= 0:
+                bit = 1 << cell
+                buckets[count[cell]] ^= bit
+                count[cell] += delta
+                buckets[count[cell]] ^= bit
+
+    def sync(self) -> None:
+        trail = self.solver.trail
+        self._shift(trail[self.synced:], -1)
+        self.synced = len(trail)
+
+    def most_constrained(self, limit: int) -> list[int]:
+        """Up to limit open cells, fewest unassigned variables first (cell order among equals)."""
+        self.sync()
+        found = []
+        for bits in self.buckets[1:]:
+            while bits and len(found) < limit:
+                low = bits & -bits
+                found.append(low.bit_length() - 1)
+                bits ^= low
+            if len(found) == limit:
+                break
+        return found
+
+    def pick(self) -> Optional[int]:
+        """First unassigned variable of the cell with the fewest unassigned variables."""
+        self.sync()
+        value = self.solver.value
+        for bits in self.buckets[1:]:
+            if bits:
+                cell = (bits & -bits).bit_length() - 1
+                for var in self.cells[cell]:
+                    if value[var] is None:
+                        return var
+        return None
+
+
+def pick_MOM(solver: Solver) -> Optional[int]:
+    """heuristic_MOM over the solver's current assignment."""
+    value = solver.value
+    binaries = Counter()
+    for p in range(-solver.num_vars, solver.num_vars + 1):
+        if p and value[p] is None and value[-p] is None:
+            for q in solver.implications(p):
+                if value[q] is None:
+                    binaries[abs(q)] += 1
+    if binaries:
+        return max(binaries, key=binaries.get)
+
+    min_len = float('inf')
+    counts = defaultdict(int)
+    for clause in solver.clauses:
+        if any(value[lit] for lit in clause):
+            continue
+        unassigned = [abs(lit) for lit in clause if value[lit] is None]
+        if len(unassigned) < min_len:
+            min_len = len(unassigned)
+            counts.clear()
+        if len(unassigned) == min_len:
+            for var in unassigned:
+                counts[var] += 1
+    if not counts:
+        return None
+    return max(counts, key=counts.get)
+
+
+def pick_VSIDS(solver: Solver) -> Optional[int]:
+    """Most active unassigned variable, popped from the solver's order heap in O(log n)."""
+    order, value = solver.order, solver.value
+    while order:
+        var = order.pop()
+        if value[var] is None:
+            return var
+    return None
+
+
+def use_VSIDS(solver: Solver, cells: list):
+    solver.use_order_heap()
+    return partial(pick_VSIDS, solver)
+
+
+# --- Probing and look-ahead ---
+
+PROBE_BUDGET = 500_000  # propagations probe() may spend by default
+LOOKAHEAD_CELLS = 3  # cells whose candidates a look-ahead decision tries
+
+
+def probe_literals(solver: Solver, lits) -> Optional[list]:
+    """
+    Assumes lits on a level of their own and propagates, then backtracks.
+    Returns the literals that became true (lits included), or None if they failed.
+    """
+    level = solver.decision_level()
+    mark = len(solver.trail)
+    solver.trail_lim.append(mark)
+    failed = not all(solver.enqueue(lit) for lit in lits) or solver.propagate() is not None
+    implied = None if failed else solver.trail[mark:]
+    solver.cancel_until(level)
+    return implied
+
+
+def probe(solver: Solver, cells: list, max_propagations: Optional[int] = PROBE_BUDGET,
+          max_seconds: Optional[float] = None, cancel=None) -> Counter:
+    """
+    Failed-literal probing at level 0: both literals of every candidate of every cell are
+    propagated on their own. A failed literal is fixed false, literals implied by both
+    polarities of a variable are fixed true, and so are literals implied by every candidate
+    of a cell once propagation shows one of them has to hold.
+    Rounds repeat while they fix something, stopping early once the budget is spent or
+    cancel (a cancellation token) is set.
+    Returns counters of probes, failed literals, implied literals and rounds.
+    """
+    report = Counter()
+    if not solver.ok or solver.propagate() is not None:
+        solver.ok = False
+        return report
+    value = solver.value
+    budget_end = solver.stats['propagations'] + max_propagations if max_propagations is not None else None
+    deadline = time.time() + max_seconds if max_seconds is not None else None
+
+    def fix(lits) -> bool:
+        for lit in lits:
+            if not solver.enqueue(lit):
+                return False
+        return solver.propagate() is None
+
+    changed = True
+    while changed:
+        changed = False
+        report['rounds'] += 1
+        for cell in cells:
+            common = None  # literals implied by every candidate probed so far
+            for var in cell:
+                if ((budget_end is not None and solver.stats['propagations'] >= budget_end)
+                        or (deadline is not None and time.time() >= deadline)
+                        or (cancel is not None and cancel.is_set())):
+                    return report
+                if value[var] is not None:
+                    continue
+                report['probes'] += 2
+                positive = probe_literals(solver, [var])
+                negative = probe_literals(solver, [-var]) if positive is not None else None
+                if positive is None or negative is None:
+                    report['failed'] += 1
+                    changed = True
+                    if not fix([-var if positive is None else var]):
+                        solver.ok = False
+                        return report
+                    if positive is None:
+                        continue
+                    negative = [-var]
+                both = set(positive).intersection(negative)
+                if both:
+                    report['implied'] += len(both)
+                    changed = True
+                    if not fix(both):
+                        solver.ok = False
+                        return report
+                common = set(positive) if common is None else common.intersection(positive)
+            if not common:
+                continue
+            implied = [lit for lit in common if value[lit] is None]
+            open_vars = [var for var in cell if value[var] is None]
+            if implied and probe_literals(solver, [-var for var in open_vars]) is None:
+                report['implied'] += len(implied)
+                changed = True
+                if not fix(implied):
+                    solver.ok = False
+                    return report
+    return report
+
+
+class LookAhead:
+    """
+    Look-ahead decisions: every candidate of the LOOKAHEAD_CELLS most constrained cells is
+    propagated on a level of its own, and the one implying the most literals is branched on.
+    A failed candidate is returned at once - deciding it conflicts straight away.
+    """
+
+    def __init__(self, solver: Solver, cells: list):
+        self.solver = solver
+        self.buckets = CellBuckets(solver, cells)
+
+    def pick(self) -> Optional[int]:
+        solver, value = self.solver, self.solver.value
+        best, best_count = None, -1
+        for cell in self.buckets.most_constrained(LOOKAHEAD_CELLS):
+            for var in self.buckets.cells[cell]:
+                if value[var] is not None:
+                    continue
+                solver.stats['lookaheads'] += 1
+                implied = probe_literals(solver, [var])
+                if implied is None:
+                    return var
+                if len(implied) > best_count:
+                    best, best_count = var, len(implied)
+        return best
+
+
+# heuristic name -> factory(solver, cells) returning the pick() used by the search
+HEURISTICS = {
+    'MRV': lambda solver, cells: CellBuckets(solver, cells).pick,
+    'MOM': lambda solver, cells: partial(pick_MOM, solver),
+    'VSIDS': use_VSIDS,
+    'lookahead': lambda solver, cells: LookAhead(solver, cells).pick,
+}
+
+
+# --- Preprocessing ---
+# Simplifies the integer formula between encoding and search. Every step keeps the formula
+# satisfiable exactly when it was; eliminated clauses are kept to extend the model afterwards.
+
+PREPROCESS_STEPS = ('units', 'pure', 'duplicates', 'subsumption', 'self_subsumption', 'elimination')
+ELIM_OCCURRENCE_LIMIT = 16  # variables in more clauses than this are never eliminated
+ELIM_RESOLVENT_LIMIT = 20  # nor those whose elimination needs a longer resolvent
+
+
+class Preprocessor:
+    """
+    Runs steps (names from PREPROCESS_STEPS, in the given order) over a formula in simplify()
+    and afterwards turns a model of the simplified formula into one of the original in extend_model().
+    fixed holds the values decided by unit and pure literals, eliminated the (pivot literal, clause)
+    pairs removed by variable elimination, report[step] the clauses and variables each step removed.
+    A Budget given to simplify() is polled while clauses are read and inside every step; once its
+    clock or token runs out the remaining work is skipped and stopped tells the result is unusable.
+    """
+
+    def __init__(self, steps=PREPROCESS_STEPS):
+        unknown = set(steps) - set(PREPROCESS_STEPS)
+        if unknown:
+            raise ValueError(f'Unknown preprocessing steps {sorted(unknown)}, expected some of {PREPROCESS_STEPS}')
+        self.steps = tuple(steps)
+        self.report = {}
+        self.fixed = {}
+        self.eliminated = []
+        self.ok = True
+        self.budget = None
+        self.polls = 0
+
+    def simplify(self, num_vars: int, clauses, budget: Optional['Budget'] = None) -> list[list[int]]:
+        """Returns the simplified clauses, fixed variables as unit clauses first ([[]] if unsatisfiable)."""
+        self.num_vars = num_vars
+        self.clauses = []
+        self.occurs = [set() for _ in range(2 * num_vars + 1)]
+        self.live = 0
+        self.pending = []
+        self.budget = budget
+        for clause in clauses:
+            if self.interrupted():
+                return [[]]
+            self.add(clause)
+        for step in self.steps:
+            if budget is not None and budget.expired():
+                return [[]]
+            clauses_before, variables_before = self.live, self.live_variables()
+            if self.ok:
+                getattr(self, step)()
+                self.propagate_units()
+            self.report[step] = {'clauses': clauses_before - self.live,
+                                 'variables': variables_before - self.live_variables()}
+        if self.stopped or not self.ok:
+            return [[]]
+        units = [[var if val else -var] for var, val in self.fixed.items()]
+        return units + [clause for clause in self.clauses if clause is not None]
+
+    def extend_model(self, value: list) -> None:
+        """Sets the eliminated variables in a solver value list so the original clauses hold as well."""
+        for pivot, clause in reversed(self.eliminated):
+            if not any(value[lit] for lit in clause):
+                value[pivot] = True
+                value[-pivot] = False
+
+    @property
+    def stopped(self) -> bool:
+        return self.budget is not None and self.budget.stopped_by is not None
+
+    def interrupted(self) -> bool:
+        """Polled once per loop iteration of a step: looks at the budget every BUDGET_CHECK_INTERVAL calls."""
+        if self.budget is None:
+            return False
+        if self.budget.stopped_by is None:
+            self.polls += 1
+            if self.polls % BUDGET_CHECK_INTERVAL == 0:
+                self.budget.expired()
+        return self.budget.stopped_by is not None
+
+    def live_variables(self) -> int:
+        occurs = self.occurs
+        return sum(1 for var in range(1, self.num_vars + 1) if occurs[var] or occurs[-var])
+
+    # --- clause database ---
+
+    def add(self, lits) -> None:
+        clause = list(dict.fromkeys(lits))
+        if len(set(map(abs, clause))) < len(clause):
+            return
+        fixed = self.fixed
+        if fixed:
+            if any(fixed.get(abs(lit)) == (lit > 0) for lit in clause):
+                return
+            clause = [lit for lit in clause if abs(lit) not in fixed]
+        if not clause:
+            self.ok = False
+            return
+        k = len(self.clauses)
+        self.clauses.append(clause)
+        for lit in clause:
+            self.occurs[lit].add(k)
+        self.live += 1
+        if len(clause) == 1:
+            self.pending.append(clause[0])
+
+    def remove(self, k: int) -> None:
+        for lit in self.clauses[k]:
+            self.occurs[lit].discard(k)
+        self.clauses[k] = None
+        self.live -= 1
+
+    def strengthen(self, k: int, lit: int) -> None:
+        clause = self.clauses[k]
+        clause.remove(lit)
+        self.occurs[lit].discard(k)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.pending.append(clause[0])
+
+    def assign(self, lit: int) -> None:
+        var = abs(lit)
+        if var in self.fixed:
+            if self.fixed[var] != (lit > 0):
+                self.ok = False
+            return
+        self.fixed[var] = lit > 0
+        for k in list(self.occurs[lit]):
+            self.remove(k)
+        for k in list(self.occurs[-lit]):
+            self.strengthen(k, -lit)
+
+    def propagate_units(self) -> None:
+        while self.pending and self.ok:
+            self.assign(self.pending.pop())
+
+    # --- steps ---
+
+    def units(self) -> None:
+        """Unit propagation: fixes unit clauses, drops satisfied clauses and false literals."""
+        self.propagate_units()
+
+    def pure(self) -> None:
+        """Fixes literals whose negation appears nowhere, until none are left."""
+        occurs, changed = self.occurs, True
+        while changed and self.ok:
+            changed = False
+            for var in range(1, self.num_vars + 1):
+                if self.interrupted():
+                    return
+                if occurs[var] and not occurs[-var]:
+                    self.assign(var)
+                    changed = True
+                elif occurs[-var] and not occurs[var]:
+                    self.assign(-var)
+                    changed = True
+
+    def duplicates(self) -> None:
+        """Removes clauses with the same literals as an earlier one."""
+        seen = set()
+        for k, clause in enumerate(self.clauses):
+            if self.interrupted():
+                return
+            if clause is None:
+                continue
+            key = frozenset(clause)
+            if key in seen:
+                self.remove(k)
+            else:
+                seen.add(key)
+
+    def subsumption(self) -> None:
+        """
+        Removes clauses containing every literal of another clause. Binary clauses can only be
+        subsumed by duplicates and units, so only the longer ones are checked.
+        """
+        clauses, occurs = self.clauses, self.occurs
+        for k, clause in enumerate(clauses):
+            if self.interrupted():
+                return
+            if clause is None or len(clause) < 3:
+                continue
+            members = set(clause)
+            if any(other != k and len(clauses[other]) <= len(clause) and members.issuperset(clauses[other])
+                   for lit in clause for other in occurs[lit]):
+                self.remove(k)
+
+    def self_subsumption(self) -> None:
+        """Strengthens D to D - {lit} when some clause C has -lit and its other literals inside D."""
+        clauses, occurs = self.clauses, self.occurs
+        for k, clause in enumerate(clauses):
+            if self.interrupted():
+                return
+            if clause is None:
+                continue
+            members = set(clause)
+            for lit in list(clause):
+                for other in occurs[-lit]:
+                    resolving = clauses[other]
+                    if len(resolving) <= len(clause) and all(q == -lit or q in members for q in resolving):
+                        self.strengthen(k, lit)
+                        members.discard(lit)
+                        break
+            if self.pending:
+                self.propagate_units()
+            if not self.ok:
+                return
+
+    def elimination(self) -> None:
+        """
+        Bounded variable elimination: replaces the clauses of a variable by all their
+        non-tautological resolvents on it when there are no more of those than of them.
+        """
+        clauses, occurs = self.clauses, self.occurs
+        order = sorted((var for var in range(1, self.num_vars + 1) if occurs[var] or occurs[-var]),
+                       key=lambda var: len(occurs[var]) * len(occurs[-var]))
+        for var in order:
+            if self.interrupted():
+                return
+            positive, negative = occurs[var], occurs[-var]
+            limit = len(positive) + len(negative)
+            if not limit or limit > ELIM_OCCURRENCE_LIMIT:
+                continue
+            resolvents = []
+            for p, n in product(positive, negative):
+                resolvent = (set(clauses[p]) | set(clauses[n])) - {var, -var}
+                if any(-lit in resolvent for lit in resolvent):
+                    continue
+                if len(resolvent) > ELIM_RESOLVENT_LIMIT or len(resolvents) == limit:
+                    break
+                resolvents.append(resolvent)
+            else:
+                self.eliminate(var, resolvents)
+                if not self.ok:
+                    return
+
+    def eliminate(self, var: int, resolvents: list) -> None:
+        """Replaces the clauses of var by resolvents, keeping them for extend_model."""
+        clauses, occurs = self.clauses, self.occurs
+        for pivot in (var, -var):
+            for k in list(occurs[pivot]):
+                self.eliminated.append((pivot, clauses[k][:]))
+                self.remove(k)
+        for resolvent in resolvents:
+            self.add(resolvent)
+        self.propagate_units()
+
+
+def load_formula(variables: list, CNF_formula: list, assignment: dict,
+                 preprocessor: Optional[Preprocessor] = None,
+                 budget: Optional['Budget'] = None) -> tuple[Optional[Solver], list, list]:
+    """
+    Builds a Solver for a formula in either to_CNF form, simplified by preprocessor if given
+    (the assignment then takes part in the simplification as unit clauses). The solver is
+    None if budget ran out during preprocessing.
+    Returns (solver, names, cells): names[k] is the caller's variable for internal variable k
+    (None for integer formulas, whose variables are used as-is) and cells groups the internal
+    variables of variables by board cell, in order, for MRV.
+    """
+    if is_int_form(variables, CNF_formula):
+        if isinstance(CNF_formula, ClauseArena):
+            literals = CNF_formula.lits
+        else:
+            literals = (lit for clause in CNF_formula for lit in clause)
+        num_vars = max(max(variables, default=0), max(map(abs, literals), default=0))
+        clauses = CNF_formula
+        names = None
+        ids = None
+        N = board_size(variables)
+        cell_of = lambda var: (var - 1) // N
+    else:
+        ids = {name: k for k, name in enumerate(variables, 1)}
+        names = [None] + list(variables)
+        for clause in CNF_formula:
+            for name, _ in clause:
+                if name not in ids:
+                    ids[name] = len(names)
+                    names.append(name)
+        num_vars = len(names) - 1
+        clauses = ([ids[name] if positive else -ids[name] for name, positive in clause] for clause in CNF_formula)
+        cell_of = lambda var: get_var_coords(names[var])
+
+    if preprocessor is not None:
+        to_id = ids.__getitem__ if ids is not None else int
+        units = ([to_id(var) if val else -to_id(var)] for var, val in assignment.items())
+        clauses = preprocessor.simplify(num_vars, chain(clauses, units), budget)
+        if preprocessor.stopped:
+            return None, names, []
+        assignment = {}
+    solver = Solver(num_vars, clauses)
+    for var, val in assignment.items():
+        k = ids[var] if ids is not None else var
+        if not solver.enqueue(k if val else -k):
+            solver.ok = False
+
+    # eliminated variables are left to extend_model - branching on them decides nothing
+    eliminated = {abs(pivot) for pivot, _ in preprocessor.eliminated} if preprocessor is not None else ()
+    cells = defaultdict(list)
+    for var in variables:
+        k = ids[var] if ids is not None else var
+        if k not in eliminated:
+            cells[cell_of(k)].append(k)
+    return solver, names, list(cells.values())
+
+
+# --- Restart policies ---
+# A policy sees every conflict with the LBD of the clause learned from it and tells the
+# CDCL loop when to go back to level 0. Learned clauses, activities and saved phases survive.
+
+def luby(i: int) -> int:
+    """i-th element (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i %= size
+    return 1 << seq
+
+
+class LubyRestarts:
+    """Restart after unit * luby(k) conflicts, k counting restarts."""
+
+    def __init__(self, unit: int = 100):
+        self.unit = unit
+        self.restarts = 0
+        self.conflicts = 0
+
+    def on_conflict(self, lbd: int) -> bool:
+        self.conflicts += 1
+        if self.conflicts < self.unit * luby(self.restarts):
+            return False
+        self.restarts += 1
+        self.conflicts = 0
+        return True
+
+
+class GeometricRestarts:
+    """Restart after first, first * factor, first * factor^2, ... conflicts."""
+
+    def __init__(self, first: int = 100, factor: float = 1.5):
+        self.limit = first
+        self.factor = factor
+        self.restarts = 0
+        self.conflicts = 0
+
+    def on_conflict(self, lbd: int) -> bool:
+        self.conflicts += 1
+        if self.conflicts < self.limit:
+            return False
+        self.restarts += 1
+        self.conflicts = 0
+        self.limit *= self.factor
+        return True
+
+
+class GlucoseRestarts:
+    """
+    Glucose dynamic restarts: restart once the average LBD of the last window conflicts
+    exceeds the average over the whole search by 1 / margin - recent clauses got worse.
+    """
+
+    def __init__(self, window: int = 50, margin: float = 0.8):
+        self.recent = deque(maxlen=window)
+        self.margin = margin
+        self.total = 0
+        self.count = 0
+        self.restarts = 0
+
+    def on_conflict(self, lbd: int) -> bool:
+        self.recent.append(lbd)
+        self.total += lbd
+        self.count += 1
+        if len(self.recent) < self.recent.maxlen:
+            return False
+        if sum(self.recent) / len(self.recent) * self.margin <= self.total / self.count:
+            return False
+        self.restarts += 1
+        self.recent.clear()
+        return True
+
+
+RESTART_POLICIES = {
+    'luby': LubyRestarts,
+    'geometric': GeometricRestarts,
+    'glucose': GlucoseRestarts,
+}
+
+SEARCH_MODES = ('dpll', 'cdcl')
+
+# is_satisfiable of a search stopped by its budget - falsy, so test it with `is UNKNOWN`
+UNKNOWN = None
+
+
+def solve_SAT(variables, CNF_formula, assignment, heuristic: str = 'MRV', mode: str = 'dpll',
+              max_learnts: Optional[int] = None, restarts: Optional[str] = None, phase_saving: bool = False,
+              preprocess=False, probing: bool = False, probe_budget: Optional[int] = PROBE_BUDGET,
+              seed: Optional[int] = None, max_decisions: Optional[int] = None, max_conflicts: Optional[int] = None,
+              max_propagations: Optional[int] = None, max_seconds: Optional[float] = None, cancel=None,
+              stats: Optional[dict] = None) -> tuple[Optional[bool], list]:
+    """
+    Searches a watched-literal Solver. Works on both encodings of to_CNF - the returned
+    assignment is keyed the same way as variables. heuristic is a key of HEURISTICS.
+    mode='dpll' backtracks chronologically, mode='cdcl' learns a clause from every conflict
+    and backjumps; its learned clause database starts at max_learnts clauses (a third of
+    the formula by default) and grows by 10% whenever it is reduced.
+    A ClauseArena formula gets its model back as an Assignment instead of a dict.
+    restarts picks a RESTART_POLICIES entry for cdcl, phase_saving makes decisions reuse
+    the last value a variable had instead of always trying True first.
+    preprocess=True runs every Preprocessor step before search, a sequence of step names
+    runs those; the model is extended back to the original formula either way.
+    probing runs probe() before search, spending at most probe_budget propagations.
+    seed shuffles the order cells and their candidates are tried in and breaks VSIDS ties
+    at random, so differently seeded runs search different trees.
+    The max_* limits and cancel (a cancellation token: anything with is_set(), such as an
+    Event) form the Budget of the search; max_seconds counts from the call, and it and cancel
+    bound preprocessing and probing as well. Once one runs out solve_SAT gives up and
+    returns (UNKNOWN, []).
+    If stats is given it is filled with the search counters, 'status' ('SAT', 'UNSAT' or
+    'UNKNOWN'), 'stopped_by' (the limit that ran out, if any), 'preprocess' with the
+    clauses and variables removed per step and 'probing' with the probe() counters.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f'Unknown search mode {mode!r}, expected one of {SEARCH_MODES}')
+    if restarts is not None and mode != 'cdcl':
+        raise ValueError('restarts need mode=\'cdcl\' - chronological DPLL would lose its progress')
+    budget = Budget(max_decisions, max_conflicts, max_propagations, max_seconds, cancel)
+    preprocessor = None
+    if preprocess:
+        preprocessor = Preprocessor() if preprocess is True else Preprocessor(preprocess)
+    solver, names, cells = load_formula(variables, CNF_formula, assignment, preprocessor, budget)
+    if solver is None:
+        if stats is not None:
+            stats.update(status='UNKNOWN', stopped_by=budget.stopped_by, preprocess=preprocessor.report)
+        return UNKNOWN, []
+    if seed is not None:
+        rng = random.Random(seed)
+        rng.shuffle(cells)
+        for cell in cells:
+            rng.shuffle(cell)
+        solver.activity = [rng.random() * 1e-6 for _ in solver.activity]
+    if probing:
+        probe_report = probe(solver, cells, probe_budget, budget.seconds_left(), cancel)
+    pick = HEURISTICS[heuristic](solver, cells)
+    if phase_saving:
+        solver.phase = [True] * (solver.num_vars + 1)
+    budget.start(solver)
+    if not solver.ok:
+        satisfiable = False
+    elif budget.expired() or budget.exhausted():
+        satisfiable = UNKNOWN
+    elif mode == 'cdcl':
+        solver.max_learnts = max_learnts or max(len(solver.clauses) // 3, 1000)
+        policy = RESTART_POLICIES[restarts]() if restarts is not None else None
+        satisfiable = cdcl(solver, pick, policy, budget)
+    else:
+        satisfiable = dpll(solver, pick, budget)
+    if stats is not None:
+        stats.update(solver.stats)
+        stats['status'] = {True: 'SAT', False: 'UNSAT', UNKNOWN: 'UNKNOWN'}[satisfiable]
+        stats['stopped_by'] = budget.stopped_by
+        if preprocessor is not None:
+            stats['preprocess'] = preprocessor.report
+        if probing:
+            stats['probing'] = dict(probe_report)
+    if not satisfiable:
+        return satisfiable, []
+
+    if preprocessor is not None:
+        preprocessor.extend_model(solver.value)
+    return True, extract_model(solver, names, CNF_formula)
+
+
+def extract_model(solver: Solver, names: Optional[list], CNF_formula, num_vars: Optional[int] = None) -> dict:
+    """
+    The solver's assigned variables keyed the caller's way (an Assignment for a ClauseArena),
+    only the first num_vars of them if given.
+    """
+    value = solver.value
+    num_vars = solver.num_vars if num_vars is None else num_vars
+    model = Assignment(num_vars) if isinstance(CNF_formula, ClauseArena) else {}
+    for var in range(1, num_vars + 1):
+        if value[var] is not None:
+            model[names[var] if names is not None else var] = value[var]
+    return model
+
+
+BUDGET_CHECK_INTERVAL = 64  # search iterations between two looks at the clock and the cancel token
+
+
+class Budget:
+    """
+    Limits of one search: decisions, conflicts and propagations counted from start(), seconds
+    of wall-clock time counted from construction, and a cancellation token (anything with
+    is_set()). exhausted() is polled once per search iteration - the counters are checked
+    every time, the clock and the token every BUDGET_CHECK_INTERVAL calls. None means no limit.
+    Preprocessing and probing only answer to the clock and the token, through expired().
+    stopped_by names the limit that ran out.
+    """
+
+    def __init__(self, decisions: Optional[int] = None, conflicts: Optional[int] = None,
+                 propagations: Optional[int] = None, seconds: Optional[float] = None, cancel=None):
+        self.limits = {name: limit for name, limit in
+                       (('decisions', decisions), ('conflicts', conflicts), ('propagations', propagations))
+                       if limit is not None}
+        self.deadline = time.time() + seconds if seconds is not None else None
+        self.cancel = cancel
+        self.stopped_by = None
+        self.stats = Counter()
+        self.base = {}
+        self.calls = 0
+
+    def start(self, solver: Solver) -> None:
+        self.stats = solver.stats
+        self.base = {name: solver.stats[name] for name in self.limits}
+        self.calls = 0
+
+    def exhausted(self) -> bool:
+        stats, base = self.stats, self.base
+        for name, limit in self.limits.items():
+            if stats[name] - base[name] >= limit:
+                self.stopped_by = name
+                return True
+        self.calls += 1
+        if self.calls % BUDGET_CHECK_INTERVAL:
+            return False
+        return self.expired()
+
+    def expired(self) -> bool:
+        """Checks the clock and the token right away - the only limits of the work before start()."""
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.stopped_by = 'seconds'
+        elif self.cancel is not None and self.cancel.is_set():
+            self.stopped_by = 'cancel'
+        return self.stopped_by is not None
+
+    def seconds_left(self) -> Optional[float]:
+        return max(self.deadline - time.time(), 0) if self.deadline is not None else None
+
+
+def dpll(solver: Solver, pick, budget: Optional[Budget] = None, assumptions=()) -> Optional[bool]:
+    """
+    Chronological backtracking without recursion: each decision opens a level on the
+    solver's trail, a conflict flips the deepest decision not flipped yet (True is tried
+    first) after undoing everything above it.
+    assumptions are decided first and never flipped, so False means none of the search
+    space below them has a model; the caller backtracks to level 0 afterwards.
+    Returns UNKNOWN once the budget is exhausted.
+    """
+    # flipped[d] tells whether the decision of level d + 1 already had its False branch
+    flipped = []
+    for lit in assumptions:
+        if solver.propagate() is not None or solver.value[lit] is False:
+            return False
+        if solver.value[lit] is None:
+            flipped.append(True)
+            solver.decide(lit)
+    while True:
+        if budget is not None and budget.exhausted():
+            return UNKNOWN
+        conflict = solver.propagate()
+        if conflict is not None:
+            solver.stats['conflicts'] += 1
+            if solver.order is not None:
+                # without conflict analysis VSIDS learns from the conflicting clause alone
+                for q in conflict:
+                    solver.bump_variable(abs(q))
+                solver.decay_activities()
+            while flipped and flipped[-1]:
+                flipped.pop()
+            if not flipped:
+                return False
+            level = len(flipped) - 1
+            lit = solver.trail[solver.trail_lim[level]]
+            solver.cancel_until(level)
+            flipped[-1] = True
+            solver.decide(-lit)
+            continue
+
+        var = pick()
+        if var is None:
+            # board decided - whatever auxiliary variables are left are branched on in order
+            var = solver.first_unassigned()
+            if var is None:
+                return True
+        flipped.append(False)
+        solver.decide(solver.polarity(var))
+
+
+def cdcl(solver: Solver, pick, restarts=None, budget: Optional[Budget] = None, assumptions=()) -> Optional[bool]:
+    """
+    Conflict-driven clause learning: every conflict is analyzed to a first-UIP clause,
+    the search backjumps to the clause's second highest level and the clause asserts there.
+    restarts is an optional restart policy, budget works as in dpll.
+    assumptions[d] is decided on level d + 1 (an empty level if it is true already) and
+    decided again whenever a backjump or restart undoes it; False then means there is no
+    model under the assumptions, while learned clauses stay valid without them.
+    """
+    while True:
+        if budget is not None and budget.exhausted():
+            return UNKNOWN
+        conflict = solver.propagate()
+        if conflict is not None:
+            solver.stats['conflicts'] += 1
+            if not solver.decision_level():
+                return False
+            learnt, backjump_level = solver.analyze(conflict)
+            solver.cancel_until(backjump_level)
+            lbd = solver.learn(learnt)
+            solver.decay_activities()
+            if len(solver.learnts) >= solver.max_learnts:
+                solver.reduce_db()
+                solver.max_learnts = int(solver.max_learnts * 1.1)
+            if restarts is not None and restarts.on_conflict(lbd) and solver.decision_level():
+                solver.stats['restarts'] += 1
+                solver.cancel_until(0)
+            continue
+
+        level = solver.decision_level()
+        if level < len(assumptions):
+            lit = assumptions[level]
+            if solver.value[lit] is False:
+                return False
+            if solver.value[lit]:
+                solver.trail_lim.append(len(solver.trail))
+            else:
+                solver.decide(lit)
+            continue
+        var = pick()
+        if var is None:
+            var = solver.first_unassigned()
+            if var is None:
+                return True
+        solver.decide(solver.polarity(var))
+
+
+# --- Incremental solving ---
+
+RETIRED_PER_SIMPLIFY = 16  # retired activation literals collected before the solver drops their clauses
+
+
+class IncrementalSolver:
+    """
+    One CDCL Solver kept alive across solve() calls, for many puzzles of one board shape or
+    one puzzle under changing constraints. variables and CNF_formula come from to_CNF in any
+    encoding - usually the structure alone, to_CNF([(L, K), [], []]) - and literals are given
+    the same way: (name, bool) pairs for the string form, signed ints otherwise.
+    Clauses added with add_clauses stay for good unless guarded: guarded clauses share a
+    fresh activation literal that every later solve() assumes until retire() turns them off.
+    Learned clauses never depend on assumptions, so they carry over from call to call along
+    with level-0 facts, variable activities and, with phase_saving, saved phases (which
+    steer the next puzzle towards the last model - worth it for related puzzles only).
+    heuristic, restarts and max_learnts are as in solve_SAT with mode='cdcl'.
+    """
+
+    def __init__(self, variables, CNF_formula, heuristic: str = 'MRV', restarts: Optional[str] = 'luby',
+                 phase_saving: bool = False, max_learnts: Optional[int] = None):
+        self.variables = variables
+        self.CNF_formula = CNF_formula
+        self.solver, self.names, cells = load_formula(variables, CNF_formula, {})
+        solver = self.solver
+        self.ids = None if self.names is None else {name: k for k, name in enumerate(self.names) if k}
+        # variables past num_vars are activation literals, left out of the models
+        self.num_vars = solver.num_vars
+        self.N = board_size(variables)
+        if phase_saving:
+            solver.phase = [True] * (solver.num_vars + 1)
+        solver.max_learnts = max_learnts or max(len(solver.clauses) // 3, 1000)
+        self.pick = HEURISTICS[heuristic](solver, cells)
+        self.restarts = restarts
+        self.active = []
+        self.retired = 0
+
+    def literal(self, lit) -> int:
+        """The solver literal of a literal in the caller's form."""
+        if self.ids is None:
+            return lit
+        name, positive = lit
+        return self.ids[name] if positive else -self.ids[name]
+
+    def board_literal(self, lit: int) -> int:
+        """The solver literal of a signed var_index literal, as iter_givens and iter_sums yield them."""
+        if self.ids is None:
+            return lit
+        var = self.ids[var_name(abs(lit), self.N)]
+        return var if lit > 0 else -var
+
+    def add_clauses(self, clauses, guarded: bool = False, board: bool = False) -> Optional[int]:
+        """
+        Adds clauses between searches, in the caller's literal form or as var_index literals
+        if board is set. guarded=True puts them under a new activation literal and returns it.
+        """
+        solver = self.solver
+        to_lit = self.board_literal if board else self.literal
+        activation = None
+        if guarded:
+            activation = solver.new_var()
+            self.active.append(activation)
+        for clause in clauses:
+            lits = [to_lit(lit) for lit in clause]
+            if activation is not None:
+                lits.append(-activation)
+            solver.add_clause(lits)
+        return activation
+
+    def retire(self, activation: int) -> None:
+        """Turns the clauses guarded by activation off for good; the solver drops them now and then."""
+        self.active.remove(activation)
+        solver = self.solver
+        solver.add_clause([-activation])
+        self.retired += 1
+        if self.retired >= RETIRED_PER_SIMPLIFY and solver.ok:
+            if solver.propagate() is None:
+                solver.simplify()
+            else:
+                solver.ok = False
+            self.retired = 0
+
+    def solve(self, assumptions=(), max_decisions: Optional[int] = None, max_conflicts: Optional[int] = None,
+              max_propagations: Optional[int] = None, max_seconds: Optional[float] = None, cancel=None,
+              stats: Optional[dict] = None) -> tuple[Optional[bool], Any]:
+        """
+        Searches for a model in which every assumption (and every guarded clause still active)
+        holds. Returns (True, model) with the model keyed like variables, ready for
+        numbers_assignment, (False, []) when there is none under the assumptions, or
+        (UNKNOWN, []) once the budget runs out - the budget and stats work as in solve_SAT,
+        stats counting this call only.
+        """
+        return self.search([self.literal(lit) for lit in assumptions], max_decisions, max_conflicts,
+                           max_propagations, max_seconds, cancel, stats)
+
+    def search(self, assumptions: list, max_decisions=None, max_conflicts=None, max_propagations=None,
+               max_seconds=None, cancel=None, stats=None) -> tuple[Optional[bool], Any]:
+        """solve() with assumptions given as solver literals."""
+        solver = self.solver
+        lits = self.active + assumptions
+        budget = Budget(max_decisions, max_conflicts, max_propagations, max_seconds, cancel)
+        before = Counter(solver.stats)
+        budget.start(solver)
+        if not solver.ok:
+            satisfiable = False
+        else:
+            policy = RESTART_POLICIES[self.restarts]() if self.restarts is not None else None
+            satisfiable = cdcl(solver, self.pick, policy, budget, lits)
+        model = extract_model(solver, self.names, self.CNF_formula, self.num_vars) if satisfiable else []
+        solver.cancel_until(0)
+        if stats is not None:
+            stats.update(solver.stats - before)
+            stats['status'] = {True: 'SAT', False: 'UNSAT', UNKNOWN: 'UNKNOWN'}[satisfiable]
+            stats['stopped_by'] = budget.stopped_by
+        return satisfiable, model
+
+    def solve_puzzle(self, input: Any, **kwargs) -> tuple[Optional[bool], Any]:
+        """
+        Solves a puzzle of the loaded shape: its givens are assumed and its sum clauses added
+        guarded, then retired again. kwargs go to solve().
+        """
+        L, K = input[0]
+        if L * K != self.N:
+            raise ValueError(f'Puzzle of size {L * K} given to a solver of size {self.N}')
+        candidates = [range(1, self.N + 1)] * (self.N * self.N)
+        group = self.add_clauses(iter_sums(input, candidates, None), guarded=True, board=True)
+        givens = [self.board_literal(lit) for [lit] in iter_givens(input)]
+        try:
+            return self.search(givens, **kwargs)
+        finally:
+            self.retire(group)
+
+
+def count_solutions(input: Any, limit: Optional[int] = None, max_seconds: Optional[float] = None, cancel=None,
+                    stats: Optional[dict] = None) -> int:
+    """
+    Counts the solutions of a puzzle, stopping at limit. Models are enumerated on one
+    IncrementalSolver, each one blocked over the cell values alone before asking for the next,
+    so auxiliary variables never make one board count twice.
+    max_seconds and cancel bound the whole enumeration; if they stop it the count is a lower
+    bound. If stats is given it is filled with the search counters, 'solutions', 'times'
+    (seconds from the call to each solution), 'second_solution' (None if there is none),
+    'exhausted' (True once no solution is left) and 'stopped_by'.
+    """
+    start = time.time()
+    variables, CNF_formula = to_CNF(input, 'int')
+    solver = IncrementalSolver(variables, CNF_formula)
+    deadline = start + max_seconds if max_seconds is not None else None
+    times = []
+    satisfiable = True
+    call = {}
+    while limit is None or len(times) < limit:
+        # a search short enough never looks at the clock itself
+        if deadline is not None and time.time() >= deadline or cancel is not None and cancel.is_set():
+            satisfiable = UNKNOWN
+            call['stopped_by'] = 'seconds' if cancel is None or not cancel.is_set() else 'cancel'
+            break
+        seconds = deadline - time.time() if deadline is not None else None
+        satisfiable, model = solver.solve(max_seconds=seconds, cancel=cancel, stats=call)
+        if not satisfiable:
+            break
+        times.append(time.time() - start)
+        solver.add_clauses([[-var for var in variables if model[var]]])
+    if stats is not None:
+        stats.update(solver.solver.stats)
+        stats['solutions'] = len(times)
+        stats['times'] = times
+        stats['second_solution'] = times[1] if len(times) > 1 else None
+        stats['exhausted'] = satisfiable is False
+        stats['stopped_by'] = call.get('stopped_by')
+    return len(times)
+
+
+def is_unique(input: Any, max_seconds: Optional[float] = None, cancel=None,
+              stats: Optional[dict] = None) -> Optional[bool]:
+    """
+    True when the puzzle has exactly one solution, False when it has none or several,
+    UNKNOWN when max_seconds or cancel stopped count_solutions before it could tell.
+    """
+    report = {} if stats is None else stats
+    count = count_solutions(input, 2, max_seconds, cancel, report)
+    if count < 2 and not report['exhausted']:
+        return UNKNOWN
+    return count == 1
+
+
+# --- Exact cover ---
+# Sudoku without CNF: every placement (row, col, val) is an option covering four columns -
+# its cell, val in its row, val in its column and val in its box - and a board is a set of
+# options covering every column exactly once (Knuth's Algorithm X on dancing links).
+
+BACKENDS = ('auto', 'sat', 'dlx')
+DLX_KEYWORDS = ('max_seconds', 'cancel', 'stats')  # the solve_SAT keywords solve_DLX understands as well
+
+
+class DancingLinks:
+    """
+    Algorithm X over node arrays: node 0 is the root, nodes 1..num_columns the column
+    headers, the rest one node per (option, column) pair. left/right link the headers and
+    the nodes of an option in circles, up/down the nodes of a column; size[c] counts the
+    options still covering column c and option[n] is the option node n belongs to.
+    """
+
+    def __init__(self, num_columns: int, options: list):
+        count = num_columns + 1
+        self.left = [c - 1 for c in range(count)]
+        self.left[0] = num_columns
+        self.right = [c + 1 for c in range(count)]
+        self.right[num_columns] = 0
+        self.up = list(range(count))
+        self.down = list(range(count))
+        self.column = list(range(count))
+        self.option = [-1] * count
+        self.size = [0] * count
+        self.stats = Counter()
+        left, right, up, down = self.left, self.right, self.up, self.down
+        for index, columns in enumerate(options):
+            first = len(self.column)
+            for k, c in enumerate(columns):
+                node = first + k
+                c += 1
+                left.append(node - 1 if k else first + len(columns) - 1)
+                right.append(node + 1 if k < len(columns) - 1 else first)
+                up.append(up[c])
+                down.append(c)
+                down[up[c]] = node
+                up[c] = node
+                self.column.append(c)
+                self.option.append(index)
+                self.size[c] += 1
+
+    def cover(self, c: int) -> None:
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, c: int) -> None:
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def select(self, node: int) -> None:
+        """Covers the other columns of node's option - its own column is covered already."""
+        j = self.right[node]
+        while j != node:
+            self.cover(self.column[j])
+            j = self.right[j]
+
+    def unselect(self, node: int) -> None:
+        j = self.left[node]
+        while j != node:
+            self.uncover(self.column[j])
+            j = self.left[j]
+
+    def search(self, budget: Optional[Budget] = None) -> tuple[Optional[bool], list[int]]:
+        """
+        Finds an exact cover without recursion, always branching on the column with the
+        fewest options left. Returns (True, option indices), (False, []) or, once the budget
+        is exhausted, (UNKNOWN, []); stats counts 'decisions' and 'backtracks'.
+        """
+        right, down, column, size, stats = self.right, self.down, self.column, self.size, self.stats
+        chosen = []
+        while True:
+            if budget is not None and budget.exhausted():
+                return UNKNOWN, []
+            if right[0] == 0:
+                return True, [self.option[node] for node in chosen]
+            best, fewest = right[0], size[right[0]]
+            c = right[best]
+            while c and fewest:
+                if size[c] < fewest:
+                    best, fewest = c, size[c]
+                c = right[c]
+            if fewest:
+                self.cover(best)
+                node = down[best]
+            else:
+                # dead end: move the deepest choice to its column's next option
+                node = best
+                while node == column[node]:
+                    if node != best:
+                        self.uncover(node)
+                    if not chosen:
+                        return False, []
+                    stats['backtracks'] += 1
+                    node = chosen.pop()
+                    self.unselect(node)
+                    node = down[node]
+            stats['decisions'] += 1
+            self.select(node)
+            chosen.append(node)
+
+
+def exact_cover(input: Any) -> tuple[int, list[list[int]], list[list[tuple[int, int, int]]]]:
+    """
+    The exact cover problem of a puzzle: (num_columns, options, placements), options[k]
+    being the columns and placements[k] the (row, col, val) triples of option k.
+    Candidates come from reduce_domains. Cells tied by sum constraints get one option per
+    consistent filling of their whole group - fixing one cell of a sum pair fixes the other -
+    so the pairs are kept without columns of their own.
+    """
+    L, K = input[0]
+    N = L * K
+    domains = reduce_domains(input)
+    partners = defaultdict(list)
+    for x1, y1, x2, y2, target_sum in input[2]:
+        partners[x1 * N + y1].append((x2 * N + y2, target_sum))
+        partners[x2 * N + y2].append((x1 * N + y1, target_sum))
+
+    def columns(cell, val):
+        i, j = divmod(cell, N)
+        box = i // L * L + j // K
+        return [cell, N * N + i * N + val - 1, 2 * N * N + j * N + val - 1, 3 * N * N + box * N + val - 1]
+
+    options, placements = [], []
+    grouped = [False] * (N * N)
+    for root in range(N * N):
+        if grouped[root]:
+            continue
+        group = [root]
+        grouped[root] = True
+        for cell in group:
+            for other, _ in partners[cell]:
+                if not grouped[other]:
+                    grouped[other] = True
+                    group.append(other)
+        for val in domains[root]:
+            filling = {root: val}
+            pending = [root]
+            while pending and filling is not None:
+                cell = pending.pop()
+                for other, target_sum in partners[cell]:
+                    other_val = target_sum - filling[cell]
+                    if other not in filling and other_val in domains[other]:
+                        filling[other] = other_val
+                        pending.append(other)
+                    elif filling.get(other) != other_val:
+                        filling = None
+                        break
+            if filling is None:
+                continue
+            cover = [c for cell, val in filling.items() for c in columns(cell, val)]
+            # two cells of the group sharing a unit with the same value
+            if len(set(cover)) == len(cover):
+                options.append(cover)
+                placements.append([(*divmod(cell, N), val) for cell, val in filling.items()])
+    return 4 * N * N, options, placements
+
+
+def solve_DLX(input: Any, max_seconds: Optional[float] = None, cancel=None,
+              stats: Optional[dict] = None) -> tuple[Optional[bool], List[List[int]]]:
+    """
+    Solves a puzzle as an exact cover problem. Returns (is_satisfiable, board) with the board
+    laid out like numbers_assignment's ([[]] without a solution); max_seconds and cancel
+    work as in solve_SAT. If stats is given it is filled with the DancingLinks counters,
+    'options' and 'status'.
+    """
+    L, K = input[0]
+    N = L * K
+    budget = Budget(seconds=max_seconds, cancel=cancel)
+    num_columns, options, placements = exact_cover(input)
+    links = DancingLinks(num_columns, options)
+    budget.start(links)
+    satisfiable, chosen = links.search(budget)
+    if stats is not None:
+        stats.update(links.stats)
+        stats['options'] = len(options)
+        stats['status'] = {True: 'SAT', False: 'UNSAT', UNKNOWN: 'UNKNOWN'}[satisfiable]
+        stats['stopped_by'] = budget.stopped_by
+    if not satisfiable:
+        return satisfiable, [[]]
+    board = [[0] * N for _ in range(N)]
+    for index in chosen:
+        for i, j, val in placements[index]:
+            board[i][j] = val
+    return True, board
+
+
+def solve_board(input: Any, backend: str = 'auto', presolve: bool = True,
+                **kwargs) -> tuple[Optional[bool], List[List[int]]]:
+    """
+    Solves a puzzle end to end and returns (is_satisfiable, board) as solve_DLX does.
+    With presolve, reduce_puzzle runs first: puzzles the logic rules finish never reach a
+    backend, the others reach it with their decided cells as givens.
+    backend='sat' goes through to_CNF, solve_SAT and numbers_assignment, 'dlx' through
+    solve_DLX, and 'auto' takes DLX for puzzles without sum constraints and SAT otherwise.
+    kwargs go to the chosen solver. An explicit backend='dlx' takes DLX_KEYWORDS only, while
+    'auto' drops the other solve_SAT keywords when it picks DLX - which backend a puzzle gets
+    depends on its sums (after presolve, too), so the same call works on every puzzle.
+    A stats dict also gets the reduce_puzzle counters under 'presolve'.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend!r}, expected one of {BACKENDS}')
+    if presolve:
+        report = Counter()
+        reduced = reduce_puzzle(input, report)
+        if kwargs.get('stats') is not None:
+            kwargs['stats']['presolve'] = dict(report)
+        if reduced is None:
+            return False, [[]]
+        L, K = input[0]
+        if len(reduced[1]) == L * K * L * K:
+            return True, givens_board(reduced)
+        input = reduced
+    if backend == 'auto':
+        backend = 'sat' if input[2] else 'dlx'
+        if backend == 'dlx':
+            kwargs = {key: value for key, value in kwargs.items() if key in DLX_KEYWORDS}
+    if backend == 'dlx':
+        return solve_DLX(input, **kwargs)
+    variables, CNF_formula = to_CNF(input, 'int')
+    satisfiable, assignment = solve_SAT(variables, CNF_formula, {}, **kwargs)
+    if not satisfiable:
+        return satisfiable, [[]]
+    return True, numbers_assignment(variables, assignment, input)
+
+
+def solve_batch(problems: list, stats: Optional[dict] = None, **kwargs) -> list[tuple[Optional[bool], List[List[int]]]]:
+    """
+    Solves many puzzles, one (is_satisfiable, board) per puzzle as solve_board returns them.
+    Puzzles of one shape are propagated together by propagate_batch; the stuck ones go to
+    solve_SAT (which takes kwargs) with their decided cells as givens. Without NumPy every
+    puzzle is propagated on its own by reduce_puzzle instead.
+    If stats is given it counts the 'solved', 'contradictory' and 'stuck' puzzles and the
+    propagation 'passes'.
+    """
+    counts = Counter()
+    reduced = [None] * len(problems)
+    if np is None:
+        reduced = [reduce_puzzle(problem, counts) for problem in problems]
+    else:
+        shapes = defaultdict(list)
+        for index, problem in enumerate(problems):
+            shapes[tuple(problem[0])].append(index)
+        for indices in shapes.values():
+            batch = [problems[index] for index in indices]
+            masks, _, contradictory = propagate_batch(batch, counts)
+            for index, problem, board_masks, failed in zip(indices, batch, masks.reshape(len(batch), -1).tolist(),
+                                                            contradictory.tolist()):
+                reduced[index] = None if failed else puzzle_from_masks(problem, board_masks)
+
+    results = []
+    for problem in reduced:
+        L, K = problem[0] if problem is not None else (0, 0)
+        if problem is None:
+            counts['contradictory'] += 1
+            results.append((False, [[]]))
+        elif len(problem[1]) == L * K * L * K:
+            counts['solved'] += 1
+            results.append((True, givens_board(problem)))
+        else:
+            counts['stuck'] += 1
+            variables, CNF_formula = to_CNF(problem, 'int')
+            satisfiable, assignment = solve_SAT(variables, CNF_formula, {}, **kwargs)
+            results.append((satisfiable, numbers_assignment(variables, assignment, problem) if satisfiable else [[]]))
+    if stats is not None:
+        stats.update({key: counts[key] for key in ('solved', 'contradictory', 'stuck', 'passes')})
+    return results
+
+
+# --- Parallel solving ---
+
+# solve_SAT keyword sets raced by solve_SAT_portfolio, the most reliable ones first
+PORTFOLIO = (
+    {'heuristic': 'MRV'},
+    {'heuristic': 'VSIDS', 'mode': 'cdcl', 'restarts': 'luby', 'phase_saving': True},
+    {'heuristic': 'lookahead', 'mode': 'cdcl', 'restarts': 'glucose', 'phase_saving': True},
+    {'heuristic': 'MOM'},
+    {'heuristic': 'MRV', 'mode': 'cdcl', 'preprocess': True, 'probing': True, 'seed': 1},
+    {'heuristic': 'VSIDS', 'mode': 'cdcl', 'restarts': 'glucose', 'seed': 2},
+    {'heuristic': 'MRV', 'mode': 'cdcl', 'restarts': 'geometric', 'phase_saving': True, 'seed': 3},
+    {'heuristic': 'lookahead', 'seed': 4},
+)
+
+
+def portfolio_worker(index: int, setup: dict, variables, CNF_formula, assignment, results) -> None:
+    """Process body of solve_SAT_portfolio: puts (index, result, stats, error) on results."""
+    stats = {}
+    try:
+        result = solve_SAT(variables, CNF_formula, assignment, stats=stats, **setup)
+    except Exception as error:
+        results.put((index, None, stats, repr(error)))
+    else:
+        results.put((index, result, stats, None))
+
+
+def solve_SAT_portfolio(variables, CNF_formula, assignment, setups=PORTFOLIO, workers: Optional[int] = None,
+                        max_seconds: Optional[float] = None, cancel=None,
+                        stats: Optional[dict] = None) -> tuple[Optional[bool], list]:
+    """
+    Drop-in for solve_SAT that races the first workers setups (solve_SAT keywords, one per
+    core by default) in separate processes. The first answer wins and the other processes
+    are killed; a setup that raises or runs out of budget just leaves the race.
+    max_seconds is every setup's budget, counted from this call, and cancel (any token with
+    is_set()) is watched here - either ends the race with (UNKNOWN, []), as does every setup
+    running out of budget.
+    stats gets the winner's search counters and 'winner', the setup that answered, or
+    'status' and 'stopped_by' when there was none.
+    """
+    setups = list(setups)[:workers or max(os.cpu_count() or 1, 2)]
+    deadline = time.time() + max_seconds if max_seconds is not None else None
+    if deadline is not None:
+        setups = [dict(setup, max_seconds=max_seconds) for setup in setups]
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=portfolio_worker, daemon=True,
+                                         args=(index, setup, variables, CNF_formula, assignment, results))
+                 for index, setup in enumerate(setups)]
+    for process in processes:
+        process.start()
+    errors = []
+    stopped_by = None
+    try:
+        while len(errors) < len(processes):
+            if cancel is not None and cancel.is_set():
+                stopped_by = 'cancel'
+                break
+            if deadline is not None and time.time() >= deadline + 1:
+                # the workers stop at the deadline themselves - this only covers a stuck one
+                stopped_by = 'seconds'
+                break
+            try:
+                index, result, worker_stats, error = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    raise RuntimeError('every portfolio worker died without an answer')
+                continue
+            if error is None and result[0] is UNKNOWN:
+                stopped_by = worker_stats.get('stopped_by')
+                error = f'{setups[index]} ran out of budget'
+            if error is not None:
+                errors.append(error)
+                continue
+            if stats is not None:
+                stats.update(worker_stats)
+                stats['winner'] = setups[index]
+            return result
+        if stopped_by is None:
+            raise RuntimeError(f'every portfolio setup failed: {errors}')
+        if stats is not None:
+            stats.update(status='UNKNOWN', stopped_by=stopped_by)
+        return UNKNOWN, []
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+
+CUBES_PER_WORKER = 8  # more cubes than workers, so idle workers keep taking the next one
+MAX_CUBE_DEPTH = 6
+
+
+def split_cube(solver: Solver, buckets: CellBuckets) -> Optional[list[int]]:
+    """
+    Look-ahead choice of the cell to split on next: of the LOOKAHEAD_CELLS most constrained
+    open cells, the one with the fewest candidates surviving propagation, the most implied
+    literals breaking ties. Returns those candidates, or None when no cell is open.
+    """
+    best, best_key = None, None
+    for cell in buckets.most_constrained(LOOKAHEAD_CELLS):
+        survivors, implied = [], 0
+        for var in buckets.cells[cell]:
+            if solver.value[var] is None:
+                lits = probe_literals(solver, [var])
+                if lits is not None:
+                    survivors.append(var)
+                    implied += len(lits)
+        key = (len(survivors), -implied)
+        if best_key is None or key < best_key:
+            best, best_key = survivors, key
+    return best
+
+
+def make_cubes(solver: Solver, cells: list, count: int) -> list[list[int]]:
+    """
+    Splits the search space into at least count cubes (unless it runs out of cells or
+    MAX_CUBE_DEPTH first): each round every cube is assumed and extended by every surviving
+    candidate of its split_cube cell. Cubes refuted by propagation are dropped, so the
+    cubes cover every model.
+    """
+    buckets = CellBuckets(solver, cells)
+    cubes = [[]]
+    for _ in range(MAX_CUBE_DEPTH):
+        if len(cubes) >= count:
+            break
+        split, grown = False, []
+        for cube in cubes:
+            solver.trail_lim.append(len(solver.trail))
+            if all(solver.enqueue(lit) for lit in cube) and solver.propagate() is None:
+                candidates = split_cube(solver, buckets)
+                if candidates is None:
+                    grown.append(cube)
+                else:
+                    split = True
+                    grown.extend(cube + [var] for var in candidates)
+            solver.cancel_until(0)
+        cubes = grown
+        if not split:
+            break
+    return cubes
+
+
+# state of a cube worker process, set once by cube_worker_init
+cube_worker = {}
+
+
+def cube_worker_init(variables, CNF_formula, heuristic: str, cancel, deadline: Optional[float] = None) -> None:
+    solver, names, cells = load_formula(variables, CNF_formula, {})
+    cube_worker.update(solver=solver, names=names, CNF_formula=CNF_formula, cancel=cancel, deadline=deadline,
+                       pick=HEURISTICS[heuristic](solver, cells))
+
+
+def solve_cube(cube: list[int]) -> tuple[Optional[bool], Any]:
+    """
+    Searches below cube in this worker's solver until the shared deadline or cancel.
+    Returns (satisfiable, model or None), satisfiable being UNKNOWN if stopped.
+    """
+    solver, deadline = cube_worker['solver'], cube_worker['deadline']
+    budget = Budget(seconds=deadline - time.time() if deadline is not None else None, cancel=cube_worker['cancel'])
+    budget.start(solver)
+    satisfiable = solver.ok and dpll(solver, cube_worker['pick'], budget, cube)
+    model = extract_model(solver, cube_worker['names'], cube_worker['CNF_formula']) if satisfiable else None
+    solver.cancel_until(0)
+    return satisfiable, model
+
+
+def solve_SAT_cubes(variables, CNF_formula, assignment, workers: Optional[int] = None,
+                    cubes_per_worker: int = CUBES_PER_WORKER, heuristic: str = 'MRV',
+                    max_seconds: Optional[float] = None, cancel=None,
+                    stats: Optional[dict] = None) -> tuple[Optional[bool], list]:
+    """
+    Cube-and-conquer drop-in for solve_SAT: make_cubes splits the formula on look-ahead cells
+    into cubes_per_worker cubes per worker, and a ProcessPoolExecutor of workers processes
+    (one per core by default) searches below them with DPLL, each worker loading the formula
+    once. Workers pull the next cube whenever they finish one; the first model found sets
+    an Event that stops the others.
+    max_seconds (counted from this call) and cancel (any token with is_set(), watched here)
+    stop the workers as well; without a model the answer is then (UNKNOWN, []).
+    stats gets the number of cubes, how many were refuted and how many were stopped
+    unfinished ('unknown'), the splitting time, 'status' and 'stopped_by'.
+    """
+    workers = workers or os.cpu_count() or 1
+    t0 = time.time()
+    deadline = t0 + max_seconds if max_seconds is not None else None
+    solver, names, cells = load_formula(variables, CNF_formula, assignment)
+    if not solver.ok or solver.propagate() is not None:
+        return False, []
+    cubes = make_cubes(solver, cells, workers * cubes_per_worker)
+    # the workers start from the bare formula - the assignment rides along in every cube
+    fixed = solver.trail[:]
+    split_time = time.time() - t0
+    counts = Counter(refuted=0, unknown=0)
+    satisfiable, model, stopped_by = False, [], None
+
+    # the workers watch stop, set here on the caller's cancel or once the answer is known
+    stop = multiprocessing.Event()
+    with ProcessPoolExecutor(workers, initializer=cube_worker_init,
+                             initargs=(variables, CNF_formula, heuristic, stop, deadline)) as executor:
+        pending = {executor.submit(solve_cube, fixed + cube) for cube in cubes}
+        try:
+            while pending and not satisfiable:
+                if cancel is not None and cancel.is_set():
+                    stopped_by = 'cancel'
+                    break
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, cube_model = future.result()
+                    if result:
+                        satisfiable, model = True, cube_model
+                    elif result is UNKNOWN:
+                        # only the deadline stops a worker while the search is on
+                        counts['unknown'] += 1
+                        stopped_by = 'seconds'
+                    else:
+                        counts['refuted'] += 1
+        finally:
+            stop.set()
+            for future in pending:
+                future.cancel()
+    if not satisfiable:
+        counts['unknown'] = len(cubes) - counts['refuted']
+        if counts['unknown']:
+            satisfiable = UNKNOWN
+    if stats is not None:
+        stats.update(counts, cubes=len(cubes), split_time=split_time,
+                     status={True: 'SAT', False: 'UNSAT', UNKNOWN: 'UNKNOWN'}[satisfiable],
+                     stopped_by=None if satisfiable else stopped_by)
+    return satisfiable, model
+
+
+def solve_SAT_rescan(variables, CNF_formula, assignment) -> tuple[bool, list]:
+    # The clause-rescanning DPLL solve_SAT used before the watched-literal Solver, kept as a baseline.
+    # Works on both encodings of to_CNF - the assignment is keyed the same way as variables.
     # 1. Simplify formula (Unit Propagation)
     # Note: We now capture the simplified 'current_formula'
     res_status, res_assignment, simplified_formula = unit_propogation(variables, CNF_formula, assignment)
@@ -208,14 +3234,14 @@ def solve_SAT(variables, CNF_formula, assignment) -> tuple[bool, list]:
     # Try True
     assignment_true = assignment.copy()
     assignment_true[chosen_var] = True
-    is_sat, final_assign = solve_SAT(variables, simplified_formula, assignment_true)
+    is_sat, final_assign = solve_SAT_rescan(variables, simplified_formula, assignment_true)
     if is_sat:
         return True, final_assign
 
     # Try False
     assignment_false = assignment.copy()
     assignment_false[chosen_var] = False
-    is_sat, final_assign = solve_SAT(variables, simplified_formula, assignment_false)
+    is_sat, final_assign = solve_SAT_rescan(variables, simplified_formula, assignment_false)
     if is_sat:
         return True, final_assign
 
@@ -240,13 +3266,14 @@ def get_var_coords(var_str: str) -> tuple[str, str]:
 
 # --- Optimized Heuristics ---
 
-def heuristic_MOM(clauses: list, assignment: dict) -> Optional[str]:
+def heuristic_MOM(clauses: list, assignment: dict) -> Optional[Any]:
     """
     Maximum Occurrences in Minimum Length Clauses.
     Optimized to avoid list allocations and unnecessary looping.
     """
     min_len = float('inf')
     counts = defaultdict(int)
+    int_form = is_int_form([], clauses)
 
     for clause in clauses:
         # 1. Check if satisfied & count unassigned in one pass
@@ -254,7 +3281,8 @@ def heuristic_MOM(clauses: list, assignment: dict) -> Optional[str]:
         unassigned = []
         is_satisfied = False
 
-        for var, polarity in clause:
+        for lit in clause:
+            var, polarity = (abs(lit), lit > 0) if int_form else lit
             if var in assignment:
                 if assignment[var] == polarity:
                     is_satisfied = True
@@ -284,19 +3312,32 @@ def heuristic_MOM(clauses: list, assignment: dict) -> Optional[str]:
     return max(counts, key=counts.get)
 
 
-def heuristic_MRV(variables: list, assignment: dict) -> Optional[str]:
+def board_size(variables: list) -> int:
+    """Returns N for integer variables - recorded by to_CNF, else the smallest N with N^3 >= max var."""
+    N = getattr(variables, 'N', 0)
+    if N:
+        return N
+    max_var = max(variables, default=0)
+    N = round(max_var ** (1 / 3)) if max_var else 0
+    while N ** 3 < max_var:
+        N += 1
+    return N
+
+
+def heuristic_MRV(variables: list, assignment: dict) -> Optional[Any]:
     """
     Minimum Remaining Values (Sudoku Specific).
     Iterates variables directly (O(N)) instead of clauses (O(M)).
     """
     cell_counts = defaultdict(int)
     cell_vars = defaultdict(list)
+    N = board_size(variables) if is_int_form(variables, []) else 0
 
     # Iterate ALL variables to find unassigned ones
     for var in variables:
         if var not in assignment:
-            r, c = get_var_coords(var)
-            cell_key = (r, c)
+            # integer variables of one cell share (var - 1) // N
+            cell_key = (var - 1) // N if N else get_var_coords(var)
             cell_counts[cell_key] += 1
             cell_vars[cell_key].append(var)
 
@@ -313,6 +3354,7 @@ def heuristic_MRV(variables: list, assignment: dict) -> Optional[str]:
 
 '''
 def solve_SAT(variables, CNF_formula, assignment) -> tuple[bool, list]:
+    # Works on both encodings of to_CNF - the assignment is keyed the same way as variables.
     # 1. Simplify formula based on current assignment (Unit Propagation Loop)
     # We loop until no more unit clauses are found
     res = unit_propogation(variables, CNF_formula, assignment)
@@ -395,14 +3437,40 @@ def clause_status(clause, assignment):
     return "unresolved", None
 
 
+def int_clause_status(clause, assignment):
+    """clause_status for signed int literals: literal l is true when assignment[abs(l)] == (l > 0)."""
+    unassigned_literals = []
+
+    for lit in clause:
+        var = lit if lit > 0 else -lit
+        if var in assignment:
+            if assignment[var] == (lit > 0):
+                return "satisfied", None
+        else:
+            unassigned_literals.append(lit)
+
+    if len(unassigned_literals) == 0:
+        return "conflict", None
+
+    if len(unassigned_literals) == 1:
+        lit = unassigned_literals[0]
+        return "unit", (abs(lit), lit > 0)
+
+    return "unresolved", None
+
+
 def numbers_assignment(variables: list, assignment: dict, input: Any) -> List[List[int]]:
     L, K = input[0]
     N = L * K
     board = [[0 for _ in range(N)] for _ in range(N)]
 
+    int_form = is_int_form(variables, [])
     for var in variables:
         if var in assignment.keys() and assignment[var]:
-            i, j, v = map(int, var.split(','))
+            i, j, v = var_coords(var, N) if int_form else map(int, var.split(','))
             board[i][j] = v
+    # cells decided by to_CNF(reduce=True) have no variables of their own
+    for (i, j), v in getattr(variables, 'decided', {}).items():
+        board[i][j] = v
     # print(board)
     return board
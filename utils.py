@@ -772,6 +772,88 @@ class PriorityQueue(Queue):
                 self.A.pop(i)
 
 
+class IndexedMaxHeap:
+
+    """A binary max-heap of the integers 0..len(key)-1 ordered by key[item].
+    key is shared with the caller, who may raise key[item] and then call
+    increase(item) to restore the order in O(log n); push and pop are O(log n)
+    as well and membership is O(1)."""
+
+    def __init__(self, key, items=()):
+        self.key = key
+        self.heap = []
+        self.position = [-1] * len(key)
+        for item in items:
+            self.push(item)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, item):
+        return self.position[item] >= 0
+
+    def resize(self):
+        """Makes room for items appended to key since; they start outside the heap."""
+        self.position.extend([-1] * (len(self.key) - len(self.position)))
+
+    def push(self, item):
+        if self.position[item] >= 0:
+            return
+        self.heap.append(item)
+        self.position[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        """Remove and return the item with the largest key."""
+        heap, position = self.heap, self.position
+        top = heap[0]
+        last = heap.pop()
+        position[top] = -1
+        if heap:
+            heap[0] = last
+            position[last] = 0
+            self._sift_down(0)
+        return top
+
+    def increase(self, item):
+        """Restore the heap order after key[item] grew."""
+        if self.position[item] >= 0:
+            self._sift_up(self.position[item])
+
+    def _sift_up(self, i):
+        heap, position, key = self.heap, self.position, self.key
+        item = heap[i]
+        item_key = key[item]
+        while i:
+            parent = (i - 1) >> 1
+            if key[heap[parent]] >= item_key:
+                break
+            heap[i] = heap[parent]
+            position[heap[i]] = i
+            i = parent
+        heap[i] = item
+        position[item] = i
+
+    def _sift_down(self, i):
+        heap, position, key = self.heap, self.position, self.key
+        size = len(heap)
+        item = heap[i]
+        item_key = key[item]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and key[heap[child + 1]] > key[heap[child]]:
+                child += 1
+            if key[heap[child]] <= item_key:
+                break
+            heap[i] = heap[child]
+            position[heap[i]] = i
+            i = child
+        heap[i] = item
+        position[item] = i
+
+
 # ______________________________________________________________________________
 # Useful Shorthands
 